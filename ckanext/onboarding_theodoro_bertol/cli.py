@@ -0,0 +1,163 @@
+import datetime
+import os
+
+import click
+
+from ckanext.onboarding_theodoro_bertol.lib import (
+    assignment, backfill, export, notifications, stats
+)
+from ckanext.onboarding_theodoro_bertol.lib import reindex as reindex_lib
+from ckanext.onboarding_theodoro_bertol.lib.review_state import reviewed_package_ids
+
+
+@click.group(short_help="onboarding_theodoro_bertol CLI.")
+def onboarding_theodoro_bertol():
+    """onboarding_theodoro_bertol CLI."""
+    pass
+
+
+@onboarding_theodoro_bertol.command("send-digests")
+@click.pass_context
+def send_digests(ctx):
+    """Send the pending resubmission digests that are due.
+
+    Meant to be run periodically (e.g. from cron) when
+    ckanext.onboarding_theodoro_bertol.notifications.digest_window is set.
+    """
+    flask_app = ctx.meta["flask_app"]
+    with flask_app.test_request_context():
+        sent = notifications.send_digests()
+    click.secho("Sent {} digests".format(sent), fg="green")
+
+
+@onboarding_theodoro_bertol.command("worker")
+@click.argument("queues", nargs=-1)
+@click.option("--burst", is_flag=True, help="Exit once the queues are empty")
+def worker(queues, burst):
+    """Run a background job worker together with the RQ scheduler.
+
+    Same as `ckan jobs worker`, but jobs retried after an interval (see
+    ckanext.onboarding_theodoro_bertol.notifications.retry_intervals) are
+    only put back on their queue by the scheduler.
+    """
+    from ckan.lib.jobs import Worker
+    Worker(queues).work(burst=burst, with_scheduler=True)
+
+
+@onboarding_theodoro_bertol.command("reindex")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Number of datasets sent to Solr per batch")
+@click.option("--workers", default=1, show_default=True,
+              help="Number of batches indexed in parallel")
+@click.option("--since", type=click.DateTime(), default=None,
+              help="Only datasets whose review state changed since then (UTC)")
+@click.option("--checkpoint", type=click.Path(dir_okay=False), default=None,
+              help="Only datasets changed since the last run recorded in this "
+                   "file, which is updated once the run completes")
+@click.pass_context
+def reindex(ctx, batch_size, workers, since, checkpoint):
+    """Reindex every dataset that has review fields.
+
+    Run it once after upgrading so existing datasets get the dedicated
+    review_status, reviewer_id and review_date index fields. With --since
+    or --checkpoint only the datasets whose review state changed are
+    reindexed, as found in the review history.
+    """
+    started = datetime.datetime.utcnow()
+    since = since or reindex_lib.read_since(checkpoint)
+    if since:
+        click.echo("Reindexing datasets changed since {}".format(since.isoformat()))
+        batches = reindex_lib.changed_package_ids(since, batch_size)
+    else:
+        batches = reviewed_package_ids(batch_size)
+
+    flask_app = ctx.meta["flask_app"]
+    total = 0
+    for total in reindex_lib.index_batches(batches, workers, flask_app.test_request_context):
+        click.echo("Indexed {} datasets".format(total))
+    if checkpoint:
+        reindex_lib.write_since(checkpoint, started)
+    click.secho("Reindexed {} datasets".format(total), fg="green")
+
+
+@onboarding_theodoro_bertol.command("backfill")
+@click.option("--batch-size", default=1000, show_default=True,
+              help="Datasets updated per transaction and search index batch")
+@click.option("--private-status", type=click.Choice(backfill.PRIVATE_STATUSES), default=None,
+              help="Status given to private datasets (left without one by default)")
+@click.option("--checkpoint", default="onboarding-backfill.checkpoint", show_default=True,
+              type=click.Path(dir_okay=False),
+              help="Progress file, an interrupted run resumes from it")
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint")
+@click.pass_context
+def backfill_review_status(ctx, batch_size, private_status, checkpoint, restart):
+    """Give a review status to datasets created before the plugin.
+
+    Public datasets without a review status are marked approved, private
+    ones are left alone unless --private-status is given. Safe to
+    interrupt: run it again to resume after the last completed batch.
+    """
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    progress = None
+    flask_app = ctx.meta["flask_app"]
+    with flask_app.test_request_context():
+        for progress in backfill.backfill(batch_size, private_status, checkpoint):
+            click.echo("Scanned {scanned} datasets, updated {updated}".format(**progress))
+    if progress is None:
+        click.secho("No datasets without a review status", fg="green")
+    else:
+        click.secho("Updated {updated} datasets".format(**progress), fg="green")
+
+
+@onboarding_theodoro_bertol.command("rebuild-stats")
+def rebuild_stats():
+    """Recompute the review stats from the datasets and review history.
+
+    The stats are kept up to date by the actions; run this to repair drift,
+    e.g. after datasets were purged or their extras edited directly.
+    """
+    result = stats.rebuild_stats()
+    click.secho(
+        "Rebuilt {counters} review counters, {reviews} reviews in the "
+        "time-to-review histogram".format(**result), fg="green"
+    )
+
+
+@onboarding_theodoro_bertol.command("rebalance-assignments")
+@click.option("--strategy", type=click.Choice(assignment.STRATEGIES), default=None,
+              help="Defaults to ckanext.onboarding_theodoro_bertol.assignment.strategy")
+@click.pass_context
+def rebalance_assignments(ctx, strategy):
+    """Reassign pending datasets whose reviewer was revoked.
+
+    Also assigns pending datasets that have no reviewer yet and drops the
+    assignments of datasets that are no longer pending.
+    """
+    flask_app = ctx.meta["flask_app"]
+    with flask_app.test_request_context():
+        count = assignment.rebalance(strategy)
+    click.secho("Assigned {} pending datasets".format(count), fg="green")
+
+
+@onboarding_theodoro_bertol.command("export")
+@click.option("--kind", type=click.Choice(["states", "history"]), default="states",
+              show_default=True, help="Review state of every dataset or review history")
+@click.option("--format", "fmt", type=click.Choice(sorted(export.FORMATS)), default="csv",
+              show_default=True)
+@click.option("--batch-size", default=1000, show_default=True,
+              help="Rows fetched from the database at a time")
+@click.option("-o", "--output", type=click.File("w"), default="-",
+              help="Output file (defaults to stdout)")
+def export_reviews(kind, fmt, batch_size, output):
+    """Export the review state of every dataset, or the review history.
+
+    Rows are streamed from a server-side cursor, so memory use stays flat
+    whatever the size of the export.
+    """
+    for chunk in export.export(kind, fmt, batch_size=batch_size):
+        output.write(chunk)
+
+
+def get_commands():
+    return [onboarding_theodoro_bertol]
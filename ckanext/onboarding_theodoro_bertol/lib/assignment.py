@@ -0,0 +1,155 @@
+import datetime
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+import ckan.model as model
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.model import (
+    ReviewAssignment, Reviewer, Version
+)
+
+log = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round_robin'
+LEAST_LOADED = 'least_loaded'
+STRATEGIES = (ROUND_ROBIN, LEAST_LOADED)
+
+
+def _strategy():
+    """The configured strategy, or None when automatic assignment is off"""
+    strategy = tk.config.get(
+        'ckanext.onboarding_theodoro_bertol.assignment.strategy', LEAST_LOADED
+    )
+    return strategy if strategy in STRATEGIES else None
+
+
+def roster_ids():
+    """Ids of the users who can currently be assigned reviews
+
+    The site user is a sysadmin, but not somebody who reviews datasets.
+    """
+    site_user = tk.config.get('ckan.site_id')
+    return sorted(user.id for user in Reviewer.roster() if user.name != site_user)
+
+
+def _loads(reviewer_ids):
+    counts = dict((reviewer_id, 0) for reviewer_id in reviewer_ids)
+    counts.update(model.Session.query(
+        ReviewAssignment.reviewer_id, func.count()
+    ).filter(
+        ReviewAssignment.reviewer_id.in_(reviewer_ids)
+    ).group_by(ReviewAssignment.reviewer_id))
+    return counts
+
+
+def _round_robin_start(n):
+    # Reserve n slots on a shared counter, so concurrent processes keep
+    # cycling through the roster instead of all starting at its head
+    table = Version.__table__
+    now = datetime.datetime.utcnow()
+    stmt = insert(table).values(name='assignment', version=n, modified=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': table.c.version + n, 'modified': now},
+    ).returning(table.c.version)
+    return model.Session.execute(stmt).scalar() - n
+
+
+def _choose(package_ids, reviewer_ids, strategy, exclude=None):
+    candidates = [r for r in reviewer_ids if r != exclude] or reviewer_ids
+    if strategy == ROUND_ROBIN:
+        start = _round_robin_start(len(package_ids))
+        return dict(
+            (package_id, candidates[(start + i) % len(candidates)])
+            for i, package_id in enumerate(package_ids)
+        )
+
+    loads = _loads(candidates)
+    chosen = {}
+    for package_id in package_ids:
+        reviewer_id = min(candidates, key=lambda r: (loads[r], r))
+        loads[reviewer_id] += 1
+        chosen[package_id] = reviewer_id
+    return chosen
+
+
+def assign(package_ids, exclude=None, strategy=None):
+    """Assign newly pending packages to reviewers
+
+    Packages that already have an assignment keep it. ``exclude`` is a
+    user (usually the submitter) who should not review these packages
+    unless nobody else can. Left in the session for the caller to commit.
+    Returns ``{package_id: reviewer_id}`` of the new assignments.
+    """
+    strategy = strategy or _strategy()
+    package_ids = list(package_ids)
+    if not strategy or not package_ids:
+        return {}
+    reviewer_ids = roster_ids()
+    if not reviewer_ids:
+        log.warning("No reviewers to assign %d datasets to", len(package_ids))
+        return {}
+
+    assigned = set(package_id for (package_id,) in model.Session.query(
+        ReviewAssignment.package_id
+    ).filter(ReviewAssignment.package_id.in_(package_ids)))
+    package_ids = [p for p in package_ids if p not in assigned]
+    if not package_ids:
+        return {}
+
+    chosen = _choose(package_ids, reviewer_ids, strategy, exclude)
+    now = datetime.datetime.utcnow()
+    model.Session.execute(
+        insert(ReviewAssignment.__table__).values([
+            dict(package_id=package_id, reviewer_id=reviewer_id, assigned=now)
+            for package_id, reviewer_id in chosen.items()
+        ]).on_conflict_do_nothing(index_elements=['package_id'])
+    )
+    return chosen
+
+
+def unassign(package_ids):
+    """Drop the assignments of packages that are no longer pending"""
+    package_ids = list(package_ids)
+    if package_ids:
+        model.Session.query(ReviewAssignment).filter(
+            ReviewAssignment.package_id.in_(package_ids)
+        ).delete(synchronize_session=False)
+
+
+def rebalance(strategy=None):
+    """Repair assignments after roster changes
+
+    Pending datasets assigned to users who are no longer reviewers (or not
+    assigned at all, e.g. created before automatic assignment) are given a
+    new reviewer, and assignments of datasets that are no longer pending
+    are dropped. Commits. Returns the number of datasets (re)assigned.
+    """
+    strategy = strategy or _strategy() or LEAST_LOADED
+    extra = model.package_extra_table
+    package = model.package_table
+    pending = select(extra.c.package_id).select_from(
+        extra.join(package, package.c.id == extra.c.package_id)
+    ).where(
+        extra.c.key == 'review_status',
+        extra.c.value == 'pending',
+        package.c.state == 'active',
+    )
+
+    model.Session.query(ReviewAssignment).filter(
+        ReviewAssignment.package_id.notin_(pending)
+    ).delete(synchronize_session=False)
+
+    model.Session.query(ReviewAssignment).filter(
+        ReviewAssignment.reviewer_id.notin_(roster_ids())
+    ).delete(synchronize_session=False)
+
+    unassigned = [package_id for (package_id,) in model.Session.execute(
+        pending.where(extra.c.package_id.notin_(select(ReviewAssignment.package_id)))
+    )]
+    chosen = assign(unassigned, strategy=strategy)
+    model.repo.commit()
+    log.info("Assigned %d pending datasets", len(chosen))
+    return len(chosen)
@@ -0,0 +1,142 @@
+import datetime
+import json
+import logging
+import os
+
+from sqlalchemy import and_, select
+import ckan.lib.search as search
+import ckan.model as model
+
+from ckanext.onboarding_theodoro_bertol.lib import assignment, stats, versions
+from ckanext.onboarding_theodoro_bertol.lib.review_state import (
+    read_extras, write_review_fields
+)
+
+log = logging.getLogger(__name__)
+
+# Status given to public datasets without one: they were published before
+# the review workflow existed
+PUBLIC_STATUS = 'approved'
+PRIVATE_STATUSES = ('pending',)
+
+
+def read_checkpoint(path):
+    """Return the checkpoint stored at ``path``, or an empty one"""
+    if not path or not os.path.exists(path):
+        return {'last_id': None, 'scanned': 0, 'updated': 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint stored at ``path``"""
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _unreviewed(after):
+    package = model.package_table
+    extra = model.package_extra_table
+    onclause = and_(
+        extra.c.package_id == package.c.id,
+        extra.c.key == 'review_status',
+        extra.c.value != '',
+    )
+    if 'state' in extra.c:
+        onclause = and_(onclause, extra.c.state == 'active')
+    q = select(
+        package.c.id, package.c.owner_org, package.c.private
+    ).select_from(
+        package.outerjoin(extra, onclause)
+    ).where(
+        package.c.state == 'active',
+        package.c.type == 'dataset',
+        extra.c.id.is_(None),
+    ).order_by(package.c.id)
+    if after:
+        q = q.where(package.c.id > after)
+    return q
+
+
+def backfill_batch(batch, private_status=None):
+    """Give a review status to a batch of ``(id, owner_org, private)`` rows
+
+    Public datasets become ``approved``, private ones ``private_status``
+    (left alone when None). Rows are checked again in this transaction, so
+    datasets that got a status since they were read are skipped. Updates
+    the review stats and assignments like any other transition, and bumps
+    ``metadata_modified`` so caches keyed on it drop the old review state.
+    The review history is left alone: these datasets were not reviewed.
+    Commits, then sends the datasets to Solr without a Solr commit.
+    Returns the ids written.
+    """
+    ids = [package_id for package_id, _, _ in batch]
+    current = read_extras(ids, ('review_status',))
+    rows = []
+    for package_id, owner_org, private in batch:
+        if current[package_id].get('review_status'):
+            continue
+        status = private_status if private else PUBLIC_STATUS
+        if status:
+            rows.append((package_id, owner_org, status))
+    if not rows:
+        return []
+
+    modified = datetime.datetime.utcnow()
+    for status in set(status for _, _, status in rows):
+        fields = {'review_status': status}
+        if status == 'pending':
+            fields['review_submitted'] = modified.isoformat()
+        write_review_fields(
+            [package_id for package_id, _, s in rows if s == status], fields,
+            modified=modified
+        )
+    stats.count_changes(
+        (owner_org, None, owner_org, status) for _, owner_org, status in rows
+    )
+    assignment.assign([package_id for package_id, _, status in rows if status == 'pending'])
+    versions.bump(versions.REVIEW)
+    model.repo.commit()
+
+    written = [package_id for package_id, _, _ in rows]
+    search.rebuild(package_ids=written, defer_commit=True, quiet=True)
+    return written
+
+
+def backfill(batch_size=1000, private_status=None, checkpoint_path=None):
+    """Set the review status of datasets that have none, resumably
+
+    The package table is walked in id order through a server-side cursor
+    on a dedicated connection, so batches can be committed while it is
+    open. After each batch the last id is stored in ``checkpoint_path``;
+    an interrupted run started again with the same checkpoint resumes
+    after it. Yields the checkpoint after every batch.
+    """
+    if private_status not in (None,) + PRIVATE_STATUSES:
+        raise ValueError('Invalid private status: {}'.format(private_status))
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint['last_id']:
+        log.info("Resuming review status backfill after %s", checkpoint['last_id'])
+
+    with model.meta.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(
+            _unreviewed(checkpoint['last_id'])
+        )
+        for partition in result.partitions(batch_size):
+            batch = [tuple(row) for row in partition]
+            written = backfill_batch(batch, private_status)
+            checkpoint['last_id'] = batch[-1][0]
+            checkpoint['scanned'] += len(batch)
+            checkpoint['updated'] += len(written)
+            write_checkpoint(checkpoint_path, checkpoint)
+            yield checkpoint
+
+    search.commit()
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+from ckan.plugins import toolkit as tk
+
+MISSING = object()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class TTLCache(object):
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+
+def get_cache(name, maxsize=1024, ttl=60, configurable=True):
+    """Return the process-level cache called ``name``
+
+    Size and TTL can be overridden with the
+    ``ckanext.onboarding_theodoro_bertol.cache.<name>.size`` and
+    ``ckanext.onboarding_theodoro_bertol.cache.<name>.ttl`` config options,
+    unless ``configurable`` is False (for caches whose size and TTL have
+    their own options).
+    """
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                if configurable:
+                    prefix = 'ckanext.onboarding_theodoro_bertol.cache.{}.'.format(name)
+                    maxsize = tk.asint(tk.config.get(prefix + 'size', maxsize))
+                    ttl = tk.asint(tk.config.get(prefix + 'ttl', ttl))
+                cache = TTLCache(maxsize=maxsize, ttl=ttl)
+                _caches[name] = cache
+    return cache
+
+
+def cache_stats():
+    """Hit/miss counters for every process-level cache created so far"""
+    return dict((name, cache.stats()) for name, cache in _caches.items())
+
+
+def clear_caches():
+    """Drop every process-level cache (mostly useful in tests)"""
+    with _caches_lock:
+        _caches.clear()
+
+
+def request_memo(name):
+    """Return a dict that lives for the current request only
+
+    Returns None when called outside of a request (CLI commands, jobs), in
+    which case callers should simply skip the memo.
+    """
+    if not has_request_context():
+        return None
+    attr = '_onboarding_memo_' + name
+    memo = getattr(g, attr, None)
+    if memo is None:
+        memo = {}
+        setattr(g, attr, memo)
+    return memo
@@ -0,0 +1,56 @@
+import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+import ckan.model as model
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.model import ReviewClaim
+
+
+def claim_ttl():
+    return tk.asint(tk.config.get('ckanext.onboarding_theodoro_bertol.claim.ttl', 900))
+
+
+def claim(package_id, user_id, ttl=None, now=None):
+    """Take or renew the lease of ``user_id`` on a dataset
+
+    A single upsert: the row is only overwritten if the current lease
+    belongs to the same user or has expired. Returns the expiry time of
+    the lease, or None if somebody else holds a live one. Left in the
+    session for the caller to commit.
+    """
+    now = now or datetime.datetime.utcnow()
+    expires = now + datetime.timedelta(seconds=ttl or claim_ttl())
+    table = ReviewClaim.__table__
+    stmt = insert(table).values(package_id=package_id, user_id=user_id, expires=expires)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['package_id'],
+        set_={'user_id': stmt.excluded.user_id, 'expires': stmt.excluded.expires},
+        where=(table.c.user_id == stmt.excluded.user_id) | (table.c.expires < now),
+    ).returning(table.c.expires)
+    return model.Session.execute(stmt).scalar()
+
+
+def release(package_ids, user_id=None):
+    """Drop the leases on the given datasets (only those of ``user_id``
+    if given)"""
+    package_ids = list(package_ids)
+    if not package_ids:
+        return
+    q = model.Session.query(ReviewClaim).filter(ReviewClaim.package_id.in_(package_ids))
+    if user_id:
+        q = q.filter(ReviewClaim.user_id == user_id)
+    q.delete(synchronize_session=False)
+
+
+def claimed_by_others(package_ids, user_id, now=None):
+    """Return ``{package_id: holder}`` of the live leases held by others"""
+    package_ids = list(package_ids)
+    if not package_ids:
+        return {}
+    now = now or datetime.datetime.utcnow()
+    return dict(model.Session.query(ReviewClaim.package_id, ReviewClaim.user_id).filter(
+        ReviewClaim.package_id.in_(package_ids),
+        ReviewClaim.user_id != user_id,
+        ReviewClaim.expires >= now,
+    ))
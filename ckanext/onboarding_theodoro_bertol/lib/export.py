@@ -0,0 +1,98 @@
+import csv
+import datetime
+import io
+import json
+
+import ckan.model as model
+
+from ckanext.onboarding_theodoro_bertol.lib.review_state import REVIEW_FIELDS
+from ckanext.onboarding_theodoro_bertol.model import ReviewEvent
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+PACKAGE_COLUMNS = (
+    'id', 'name', 'title', 'owner_org', 'private', 'state', 'metadata_modified',
+)
+STATE_COLUMNS = PACKAGE_COLUMNS + REVIEW_FIELDS
+
+HISTORY_COLUMNS = (
+    'id', 'package_id', 'user_id', 'review_status', 'resubmitted', 'created',
+)
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_review_states(batch_size=1000):
+    """Yield the review state of every active dataset as a dict
+
+    The review extras are pivoted in the query itself and rows are read
+    through a server-side cursor ``batch_size`` at a time, so memory use
+    does not depend on the number of datasets.
+    """
+    package = model.package_table
+    q = model.Session.query(*[package.c[name] for name in PACKAGE_COLUMNS])
+    for key in REVIEW_FIELDS:
+        extra = model.package_extra_table.alias('extra_' + key)
+        onclause = (extra.c.package_id == package.c.id) & (extra.c.key == key)
+        if 'state' in extra.c:
+            onclause = onclause & (extra.c.state == 'active')
+        q = q.outerjoin(extra, onclause).add_columns(extra.c.value.label(key))
+    q = q.filter(package.c.state == 'active', package.c.type == 'dataset')
+
+    for row in q.order_by(package.c.id).yield_per(batch_size):
+        yield dict((name, _value(value)) for name, value in row._asdict().items())
+
+
+def iter_review_history(batch_size=1000, package_id=None, user_id=None):
+    """Yield every review event as a dict, oldest first
+
+    Optionally restricted to one dataset or one user. Read through a
+    server-side cursor like :py:func:`iter_review_states`.
+    """
+    q = model.Session.query(*[getattr(ReviewEvent, name) for name in HISTORY_COLUMNS])
+    if package_id:
+        q = q.filter(ReviewEvent.package_id == package_id)
+    if user_id:
+        q = q.filter(ReviewEvent.user_id == user_id)
+
+    q = q.order_by(ReviewEvent.created, ReviewEvent.id)
+    for row in q.yield_per(batch_size):
+        yield dict((name, _value(value)) for name, value in row._asdict().items())
+
+
+def to_csv(rows, columns):
+    """Encode dicts as CSV, one chunk per row after the header"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    yield buf.getvalue()
+    for row in rows:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+        yield buf.getvalue()
+
+
+def to_ndjson(rows):
+    """Encode dicts as newline-delimited JSON, one chunk per row"""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export(kind, fmt, batch_size=1000, **filters):
+    """Return a generator of the ``kind`` export (``states`` or ``history``)
+    encoded in ``fmt`` (``csv`` or ``ndjson``)"""
+    if kind == 'history':
+        rows, columns = iter_review_history(batch_size, **filters), HISTORY_COLUMNS
+    else:
+        rows, columns = iter_review_states(batch_size), STATE_COLUMNS
+    if fmt == 'ndjson':
+        return to_ndjson(rows)
+    return to_csv(rows, columns)
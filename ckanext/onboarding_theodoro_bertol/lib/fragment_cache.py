@@ -0,0 +1,119 @@
+import logging
+import threading
+
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.lib.cache import MISSING, get_cache
+
+log = logging.getLogger(__name__)
+
+CONFIG_PREFIX = 'ckanext.onboarding_theodoro_bertol.fragment_cache.'
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class MemoryBackend(object):
+    """Per-process LRU, the default and the stand-in for Redis in tests"""
+
+    def __init__(self, maxsize, ttl):
+        # Sized by the fragment_cache.* options only
+        self._cache = get_cache('fragment', maxsize=maxsize, ttl=ttl, configurable=False)
+
+    def get(self, key):
+        value = self._cache.get(key)
+        return None if value is MISSING else value
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisBackend(object):
+    """Shared between processes, using CKAN's Redis connection"""
+
+    def __init__(self, ttl):
+        from ckan.lib.redis import connect_to_redis
+        self._redis = connect_to_redis()
+        self._ttl = ttl
+        self._prefix = '{}:onboarding_fragment:'.format(tk.config.get('ckan.site_id'))
+
+    def get(self, key):
+        try:
+            value = self._redis.get(self._prefix + key)
+        except Exception as e:
+            log.warning("Fragment cache read failed: %s", e)
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        if self._ttl <= 0:
+            return
+        try:
+            self._redis.setex(self._prefix + key, self._ttl, value)
+        except Exception as e:
+            log.warning("Fragment cache write failed: %s", e)
+
+    def clear(self):
+        for key in self._redis.scan_iter(self._prefix + '*'):
+            self._redis.delete(key)
+
+
+class NullBackend(object):
+    """Disables fragment caching"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+def get_backend():
+    """Return the fragment cache backend selected in the config
+
+    ``ckanext.onboarding_theodoro_bertol.fragment_cache.backend`` is one of
+    ``memory`` (default), ``redis`` or ``none``.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = tk.config.get(CONFIG_PREFIX + 'backend', 'memory')
+                ttl = tk.asint(tk.config.get(CONFIG_PREFIX + 'ttl', 300))
+                if name == 'redis':
+                    _backend = RedisBackend(ttl)
+                elif name == 'none':
+                    _backend = NullBackend()
+                else:
+                    _backend = MemoryBackend(
+                        tk.asint(tk.config.get(CONFIG_PREFIX + 'size', 2048)), ttl
+                    )
+    return _backend
+
+
+def reset_backend():
+    """Forget the configured backend (mostly useful in tests)"""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def cached_fragment(key, render):
+    """Return the fragment stored under ``key``, rendering it on a miss
+
+    ``render`` is called without arguments and must return a string. Keys
+    must change whenever the fragment would (e.g. include the modification
+    time of the object it shows), entries are never invalidated explicitly.
+    """
+    backend = get_backend()
+    fragment = backend.get(key)
+    if fragment is None:
+        fragment = str(render())
+        backend.set(key, fragment)
+    return fragment
@@ -1,5 +1,13 @@
 import ckan.model as model
-from sqlalchemy import Boolean, or_
+from markupsafe import Markup
+from sqlalchemy import or_
+from ckan.plugins import toolkit as tk
+from ckanext.onboarding_theodoro_bertol.lib.cache import (
+    MISSING, get_cache, request_memo
+)
+from ckanext.onboarding_theodoro_bertol.lib import metrics, stats
+from ckanext.onboarding_theodoro_bertol.lib.fragment_cache import cached_fragment
+from ckanext.onboarding_theodoro_bertol.model import Reviewer
 
 def get_current_user_info():
     """Helper function to get current user information"""
@@ -8,25 +16,107 @@ def get_current_user_info():
         'timestamp': 'Generated at page load'
     }
 
-def user_is_reviewer(user_id):
-    """Check if a user has reviewer permissions"""
-    if not user_id:
-        return False
-        
-    q = model.Session.query(model.User).filter(
+def _reviewer_cache():
+    return get_cache('reviewer', maxsize=4096, ttl=300)
+
+def _query_user_is_reviewer(user_id):
+    q = model.Session.query(model.User.id).outerjoin(
+        Reviewer, Reviewer.user_id == model.User.id
+    ).filter(
         or_(model.User.id == user_id, model.User.name == user_id),
         or_(
-            model.User.plugin_extras.op("->>")("review_permission").cast(Boolean) == True,
+            Reviewer.user_id != None,
             model.User.sysadmin == True  # Sysadmins are also reviewers
         ),
         model.User.state == 'active'
     )
-    
+
     result = q.first()
     return result is not None
 
+@metrics.timed('user_is_reviewer')
+def user_is_reviewer(user_id):
+    """Check if a user has reviewer permissions
+
+    Results are memoized for the current request and cached at process
+    level, keyed by whatever identifier (id or name) the caller used.
+    """
+    if not user_id:
+        return False
+
+    memo = request_memo('reviewer')
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    cache = _reviewer_cache()
+    result = cache.get(user_id)
+    if result is MISSING:
+        result = _query_user_is_reviewer(user_id)
+        cache.set(user_id, result)
+
+    if memo is not None:
+        memo[user_id] = result
+    return result
+
+def invalidate_reviewer_cache(*identifiers):
+    """Forget the cached reviewer status for the given user ids/names"""
+    identifiers = [i for i in identifiers if i]
+    _reviewer_cache().delete(*identifiers)
+    memo = request_memo('reviewer')
+    if memo is not None:
+        for identifier in identifiers:
+            memo.pop(identifier, None)
+
+def get_user_display_names(user_ids):
+    """Map user ids (or names) to display names with a single query"""
+    user_ids = set(u for u in user_ids if u)
+    if not user_ids:
+        return {}
+
+    q = model.Session.query(
+        model.User.id, model.User.name, model.User.fullname
+    ).filter(
+        or_(model.User.id.in_(user_ids), model.User.name.in_(user_ids))
+    )
+    names = {}
+    for user_id, name, fullname in q:
+        names[user_id] = names[name] = fullname or name
+    return names
+
+def pending_review_count():
+    """Number of datasets pending review, for the header badge
+
+    Served from a process-level cache of the review counters, so rendering
+    the badge costs neither a search nor (usually) a query.
+    """
+    return stats.pending_count()
+
+CSRF_PLACEHOLDER = '<!-- onboarding-csrf-input -->'
+
+def review_block(pkg):
+    """Render the review status block of a dataset page
+
+    The block is cached by dataset id, ``metadata_modified``, the viewer's
+    reviewer flag and the UI language. The CSRF token is session specific,
+    so the cached markup holds a placeholder replaced on every render.
+    """
+    user = tk.g.userobj if 'userobj' in tk.g else None
+    is_reviewer = user_is_reviewer(user.id if user else None)
+    key = 'review_block:{}:{}:{}:{}'.format(
+        pkg['id'], pkg.get('metadata_modified'), int(is_reviewer), tk.h.lang()
+    )
+
+    fragment = cached_fragment(key, lambda: tk.render_snippet(
+        'snippets/review_block.html',
+        pkg=pkg, is_reviewer=is_reviewer, csrf_placeholder=Markup(CSRF_PLACEHOLDER)
+    ))
+    csrf_input = tk.h.csrf_input() if 'csrf_input' in tk.h else ''
+    return Markup(fragment.replace(CSRF_PLACEHOLDER, str(csrf_input)))
+
 def get_helpers():
     return {
         'get_current_user_info': get_current_user_info,
-        'user_is_reviewer': user_is_reviewer
+        'user_is_reviewer': user_is_reviewer,
+        'pending_review_count': pending_review_count,
+        'review_block': review_block
     }
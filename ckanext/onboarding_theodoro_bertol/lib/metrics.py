@@ -0,0 +1,202 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.lib.cache import cache_stats
+
+log = logging.getLogger(__name__)
+
+CONFIG_PREFIX = 'ckanext.onboarding_theodoro_bertol.metrics.'
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_enabled = False
+_configure_lock = threading.Lock()
+_hooks_installed = False
+
+_lock = threading.Lock()
+_calls = defaultdict(int)           # (operation, outcome) -> count
+_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+_seconds = defaultdict(float)       # operation -> total latency
+_queries = defaultdict(int)         # operation -> SQL statements
+_solr = defaultdict(int)            # operation -> Solr requests
+
+# Operations being measured in the current thread, innermost last. A SQL
+# statement or Solr request counts towards all of them.
+_local = threading.local()
+
+
+def enabled():
+    return _enabled
+
+
+def _active():
+    active = getattr(_local, 'active', None)
+    if active is None:
+        active = _local.active = []
+    return active
+
+
+def _count_query(*args, **kwargs):
+    for measurement in getattr(_local, 'active', ()):
+        measurement['queries'] += 1
+
+
+def _install_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    # CKAN talks to Solr through pysolr and has no hook for it: count the
+    # HTTP requests pysolr sends
+    try:
+        import pysolr
+    except ImportError:
+        log.warning("pysolr not available, Solr requests will not be counted")
+    else:
+        send = pysolr.Solr._send_request
+
+        @functools.wraps(send)
+        def _send_request(*args, **kwargs):
+            for measurement in getattr(_local, 'active', ()):
+                measurement['solr'] += 1
+            return send(*args, **kwargs)
+
+        pysolr.Solr._send_request = _send_request
+    _hooks_installed = True
+
+
+def configure(config=None):
+    """Turn metrics collection on or off according to the config
+
+    Collection is off unless ``ckanext.onboarding_theodoro_bertol.metrics.enabled``
+    is true. When off, instrumented functions cost a single flag check.
+    """
+    global _enabled
+    config = tk.config if config is None else config
+    with _configure_lock:
+        _enabled = tk.asbool(config.get(CONFIG_PREFIX + 'enabled', False))
+        if _enabled:
+            _install_hooks()
+
+
+def reset():
+    """Drop every collected value (mostly useful in tests)"""
+    with _lock:
+        for values in (_calls, _buckets, _seconds, _queries, _solr):
+            values.clear()
+
+
+def _record(operation, outcome, seconds, measurement):
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        _calls[(operation, outcome)] += 1
+        _buckets[operation][index] += 1
+        _seconds[operation] += seconds
+        _queries[operation] += measurement['queries']
+        _solr[operation] += measurement['solr']
+
+
+def timed(operation):
+    """Decorator recording the latency, outcome, SQL statements and Solr
+    requests of every call of the decorated function as ``operation``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            measurement = {'queries': 0, 'solr': 0}
+            active = _active()
+            active.append(measurement)
+            outcome = 'error'
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                active.remove(measurement)
+                _record(operation, outcome, seconds, measurement)
+        return wrapper
+    return decorator
+
+
+def _labels(**labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in sorted(labels.items())
+    ) + '}'
+
+
+def _le(bound):
+    return '+Inf' if bound is None else repr(float(bound))
+
+
+def render():
+    """Return the collected metrics in the Prometheus text format
+
+    Values are per process: with several CKAN workers, each one is a
+    separate target (or scraped through a load balancer, which samples
+    one of them at a time).
+    """
+    with _lock:
+        calls = dict(_calls)
+        buckets = dict((k, list(v)) for k, v in _buckets.items())
+        seconds = dict(_seconds)
+        queries = dict(_queries)
+        solr = dict(_solr)
+
+    lines = [
+        '# HELP onboarding_operation_calls_total Calls of instrumented operations',
+        '# TYPE onboarding_operation_calls_total counter',
+    ]
+    for (operation, outcome), count in sorted(calls.items()):
+        lines.append('onboarding_operation_calls_total{} {}'.format(
+            _labels(operation=operation, outcome=outcome), count))
+
+    lines.extend([
+        '# HELP onboarding_operation_duration_seconds Latency of instrumented operations',
+        '# TYPE onboarding_operation_duration_seconds histogram',
+    ])
+    for operation, counts in sorted(buckets.items()):
+        cumulative = 0
+        for bound, count in zip(list(LATENCY_BUCKETS) + [None], counts):
+            cumulative += count
+            lines.append('onboarding_operation_duration_seconds_bucket{} {}'.format(
+                _labels(operation=operation, le=_le(bound)), cumulative))
+        lines.append('onboarding_operation_duration_seconds_sum{} {}'.format(
+            _labels(operation=operation), seconds[operation]))
+        lines.append('onboarding_operation_duration_seconds_count{} {}'.format(
+            _labels(operation=operation), cumulative))
+
+    for name, help_text, values in (
+        ('onboarding_operation_sql_queries_total',
+         'SQL statements executed by instrumented operations', queries),
+        ('onboarding_operation_solr_requests_total',
+         'Solr requests sent by instrumented operations', solr),
+    ):
+        lines.extend(['# HELP {} {}'.format(name, help_text), '# TYPE {} counter'.format(name)])
+        for operation, count in sorted(values.items()):
+            lines.append('{}{} {}'.format(name, _labels(operation=operation), count))
+
+    caches = sorted(cache_stats().items())
+    for name, key, help_text in (
+        ('onboarding_cache_hits_total', 'hits', 'Hits of the extension caches'),
+        ('onboarding_cache_misses_total', 'misses', 'Misses of the extension caches'),
+    ):
+        lines.extend(['# HELP {} {}'.format(name, help_text), '# TYPE {} counter'.format(name)])
+        for cache, values in caches:
+            lines.append('{}{} {}'.format(name, _labels(cache=cache), values[key]))
+    return '\n'.join(lines) + '\n'
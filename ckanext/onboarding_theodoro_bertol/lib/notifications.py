@@ -0,0 +1,257 @@
+import datetime
+import logging
+import smtplib
+import time
+from email import utils
+from email.mime.text import MIMEText
+from itertools import groupby
+
+from sqlalchemy import func
+import ckan.model as model
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.model import (
+    NotificationFailure, PendingNotification
+)
+
+log = logging.getLogger(__name__)
+
+RESUBMISSION = 'resubmission'
+
+
+def _config(key, default):
+    return tk.config.get('ckanext.onboarding_theodoro_bertol.notifications.' + key, default)
+
+
+def _max_retries():
+    return tk.asint(_config('max_retries', 3))
+
+
+def _retry_intervals():
+    return [tk.asint(i) for i in tk.aslist(_config('retry_intervals', ''))]
+
+
+def _digest_window():
+    return tk.asint(_config('digest_window', 0))
+
+
+def enqueue_resubmission_notification(reviewer_id, dataset):
+    """Queue the e-mail telling ``reviewer_id`` that ``dataset`` was resubmitted
+
+    With the default ``rq`` backend the e-mail is sent by a CKAN background
+    job (``ckan jobs worker``), retried and dead-lettered into
+    ``onboarding_notification_failure`` once all attempts failed. Retries
+    are put straight back on the queue, unless retry intervals are
+    configured: RQ then schedules them, which only a worker running the RQ
+    scheduler (``ckan onboarding_theodoro_bertol worker``) picks up. The
+    ``inline`` backend runs the same attempts in-process, which is meant
+    for tests and development setups without Redis.
+
+    When a digest window is configured the notification is only stored, and
+    :py:func:`send_digests` later sends one message per reviewer.
+    """
+    kwargs = {
+        'reviewer_id': reviewer_id,
+        'dataset_id': dataset['id'],
+        'dataset_title': dataset.get('title'),
+    }
+
+    if _digest_window() > 0:
+        model.Session.add(PendingNotification(
+            kind=RESUBMISSION,
+            recipient_id=reviewer_id,
+            package_id=dataset['id'],
+            title=dataset.get('title'),
+        ))
+        model.Session.commit()
+        return
+
+    if _config('backend', 'rq') == 'inline':
+        _run_inline(kwargs)
+        return
+
+    from rq import Retry
+    tk.enqueue_job(
+        send_resubmission_notification,
+        kwargs=kwargs,
+        title='Resubmission notification for {}'.format(dataset['id']),
+        queue=_config('queue', 'default'),
+        rq_kwargs={'retry': Retry(max=_max_retries(), interval=_retry_intervals() or 0)},
+    )
+
+
+def send_resubmission_notification(reviewer_id, dataset_id, dataset_title=None):
+    """Background job sending the resubmission e-mail
+
+    Failures are re-raised so RQ can retry the job; on the last attempt the
+    notification is recorded as a dead letter first.
+    """
+    try:
+        _deliver(reviewer_id, dataset_id, dataset_title)
+    except Exception as e:
+        from rq import get_current_job
+        job = get_current_job()
+        if job is None or not job.retries_left:
+            _dead_letter(reviewer_id, dataset_id, e, _max_retries() + 1)
+        raise
+
+
+def _run_inline(kwargs):
+    attempts = _max_retries() + 1
+    error = None
+    for attempt in range(attempts):
+        try:
+            _deliver(**kwargs)
+            return
+        except Exception as e:
+            log.warning("Notification attempt %d/%d failed: %s", attempt + 1, attempts, e)
+            error = e
+    _dead_letter(kwargs['reviewer_id'], kwargs['dataset_id'], error, attempts)
+
+
+def _render_resubmission(reviewer, dataset_id, dataset_title):
+    title = dataset_title or 'Untitled'
+    subject = f"Dataset Resubmitted for Review: {title}"
+    body = f"""
+    Hello {reviewer.display_name or 'Reviewer'},
+
+    A dataset you previously reviewed has been modified and resubmitted for review.
+
+    Dataset: {title}
+    URL: {tk.url_for('dataset.read', id=dataset_id, _external=True)}
+
+    The dataset is now pending your review.
+
+    Best regards,
+    CKAN System
+    """
+    return subject, body
+
+
+def _deliver(reviewer_id, dataset_id, dataset_title=None):
+    reviewer = model.User.get(reviewer_id)
+    if not reviewer or not reviewer.email:
+        log.info("No e-mail address for reviewer %s, notification dropped", reviewer_id)
+        return
+
+    subject, body = _render_resubmission(reviewer, dataset_id, dataset_title)
+
+    from ckan.lib.mailer import mail_recipient
+    mail_recipient(reviewer.display_name, reviewer.email, subject, body)
+    log.info("Sent resubmission notification to %s for dataset %s", reviewer.email, dataset_id)
+
+
+def _dead_letter(reviewer_id, dataset_id, error, attempts):
+    log.error("Giving up on notification to %s for dataset %s: %s", reviewer_id, dataset_id, error)
+    model.Session.add(NotificationFailure(
+        kind=RESUBMISSION,
+        recipient_id=reviewer_id,
+        package_id=dataset_id,
+        attempts=attempts,
+        error=str(error),
+    ))
+    model.Session.commit()
+
+
+def _smtp_connect():
+    """Open an SMTP session configured the same way as ckan.lib.mailer"""
+    config = tk.config
+    if 'smtp.test_server' in config:
+        server = config['smtp.test_server']
+        starttls, user, password = False, None, None
+    else:
+        server = config.get('smtp.server')
+        starttls = tk.asbool(config.get('smtp.starttls'))
+        user = config.get('smtp.user')
+        password = config.get('smtp.password')
+
+    connection = smtplib.SMTP(server)
+    connection.ehlo()
+    if starttls:
+        if not connection.has_extn('STARTTLS'):
+            connection.quit()
+            raise smtplib.SMTPException('SMTP server does not support STARTTLS')
+        connection.starttls()
+        connection.ehlo()
+    if user:
+        connection.login(user, password)
+    return connection
+
+
+def _render_digest(reviewer, notifications):
+    subject = f"{len(notifications)} datasets resubmitted for review"
+    lines = '\n'.join(
+        "    - {}: {}".format(
+            n.title or 'Untitled',
+            tk.url_for('dataset.read', id=n.package_id, _external=True)
+        )
+        for n in notifications
+    )
+    body = f"""
+    Hello {reviewer.display_name or 'Reviewer'},
+
+    The following datasets you previously reviewed have been modified and resubmitted for review:
+
+{lines}
+
+    They are now pending your review.
+
+    Best regards,
+    CKAN System
+    """
+    return subject, body
+
+
+def send_digests(now=None):
+    """Send one digest e-mail per reviewer whose oldest pending notification
+    is older than the digest window
+
+    All messages of a run go over a single SMTP session. Notifications are
+    deleted once their digest was accepted by the server; failed ones stay
+    pending for the next run. Returns the number of digests sent.
+    """
+    now = now or datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(seconds=_digest_window())
+
+    due = [recipient_id for (recipient_id,) in model.Session.query(
+        PendingNotification.recipient_id
+    ).group_by(
+        PendingNotification.recipient_id
+    ).having(func.min(PendingNotification.created) <= cutoff)]
+    if not due:
+        return 0
+    pending = model.Session.query(PendingNotification).filter(
+        PendingNotification.recipient_id.in_(due)
+    ).order_by(PendingNotification.recipient_id, PendingNotification.created).all()
+
+    mail_from = tk.config.get('smtp.mail_from')
+    sender = utils.formataddr((tk.config.get('ckan.site_title'), mail_from))
+    sent = 0
+    connection = _smtp_connect()
+    try:
+        for recipient_id, group in groupby(pending, key=lambda n: n.recipient_id):
+            group = list(group)
+            reviewer = model.User.get(recipient_id)
+            if reviewer and reviewer.email:
+                subject, body = _render_digest(reviewer, group)
+                msg = MIMEText(body, 'plain', 'utf-8')
+                msg['Subject'] = subject
+                msg['From'] = sender
+                msg['To'] = utils.formataddr((reviewer.display_name, reviewer.email))
+                msg['Date'] = utils.formatdate(time.time())
+                try:
+                    connection.sendmail(mail_from, [reviewer.email], msg.as_string())
+                except smtplib.SMTPException as e:
+                    log.error("Could not send digest to %s: %s", reviewer.email, e)
+                    continue
+                sent += 1
+            else:
+                log.info("No e-mail address for reviewer %s, digest dropped", recipient_id)
+            for notification in group:
+                model.Session.delete(notification)
+            model.Session.commit()
+    finally:
+        connection.quit()
+
+    log.info("Sent %d notification digests", sent)
+    return sent
@@ -0,0 +1,96 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+from concurrent import futures
+
+from sqlalchemy import select
+import ckan.lib.search as search
+import ckan.model as model
+
+from ckanext.onboarding_theodoro_bertol.lib.backfill import write_checkpoint
+from ckanext.onboarding_theodoro_bertol.model import ReviewEvent
+
+log = logging.getLogger(__name__)
+
+
+def read_since(path):
+    """Return the start time of the last completed reindex recorded in
+    ``path``, or None if there is none"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return datetime.datetime.fromisoformat(json.load(f)['since'])
+
+
+def write_since(path, since):
+    """Record ``since`` as the start of the next selective reindex"""
+    write_checkpoint(path, {'since': since.isoformat()})
+
+
+def changed_package_ids(since, batch_size=500):
+    """Yield, in batches, the ids of active datasets whose review state
+    changed at or after ``since`` (naive UTC)
+
+    Read from the review history through its ``created`` index, with a
+    server-side cursor on a dedicated connection: ``search.rebuild``
+    commits the session after every batch, which would close a cursor
+    opened on it.
+    """
+    package = model.package_table
+    q = select(ReviewEvent.package_id).distinct().join(
+        package, package.c.id == ReviewEvent.package_id
+    ).where(
+        ReviewEvent.created >= since,
+        package.c.state == 'active',
+    ).order_by(ReviewEvent.package_id)
+    with model.meta.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(q)
+        for partition in result.partitions(batch_size):
+            yield [package_id for (package_id,) in partition]
+
+
+def _index_batch(batch, app_context):
+    with app_context():
+        try:
+            search.rebuild(package_ids=batch, defer_commit=True, quiet=True)
+        finally:
+            # Each worker thread has its own scoped session
+            model.Session.remove()
+    return len(batch)
+
+
+def index_batches(batches, workers=1, app_context=None):
+    """Send batches of datasets to Solr, then commit once
+
+    With more than one worker, batches are indexed by a thread pool, at
+    most ``2 * workers`` batches in flight. ``app_context`` returns the
+    context manager every batch is indexed in, as ``package_show`` needs
+    a Flask request context (e.g. ``test_request_context`` of the CLI's
+    app). Stops at the first failing batch without committing. Yields the
+    running total.
+    """
+    app_context = app_context or contextlib.nullcontext
+    total = 0
+    if workers <= 1:
+        for batch in batches:
+            with app_context():
+                search.rebuild(package_ids=batch, defer_commit=True, quiet=True)
+            total += len(batch)
+            yield total
+    else:
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for batch in batches:
+                pending.add(pool.submit(_index_batch, batch, app_context))
+                if len(pending) >= 2 * workers:
+                    done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        total += future.result()
+                        yield total
+            for future in futures.as_completed(pending):
+                total += future.result()
+                yield total
+    search.commit()
+    log.info("Reindexed %d datasets", total)
@@ -0,0 +1,382 @@
+import datetime
+import json
+import logging
+import re
+
+from sqlalchemy import or_, select
+import ckan.lib.search as search
+import ckan.model as model
+from ckan.model.types import make_uuid
+from ckan.plugins import toolkit as tk
+
+from ckanext.onboarding_theodoro_bertol.lib import assignment, stats, versions
+from ckanext.onboarding_theodoro_bertol.lib.cache import request_memo
+from ckanext.onboarding_theodoro_bertol.model import ReviewEvent
+
+log = logging.getLogger(__name__)
+
+REVIEW_FIELDS = (
+    'review_status',
+    'reviewer_id',
+    'review_date',
+    'last_reviewer_id',
+    'resubmitted_after_rejection',
+    'review_submitted',
+)
+
+# Timezone name between parentheses at the end of the display strings
+# stored by older versions, e.g. "October 18, 2026, 09:30 (America/Sao_Paulo)"
+_DISPLAY_TIMEZONE = re.compile(r'\(([^()]+)\)\s*$')
+
+
+def _extra_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else str(value)
+
+
+def parse_review_date(value):
+    """Parse a stored review_date into a naive UTC datetime
+
+    Accepts ISO-8601 strings as well as the localized display strings that
+    older versions stored, which end with the display timezone between
+    parentheses. Returns None if the value cannot be parsed.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    else:
+        from dateutil import parser, tz
+        text = str(value)
+        display_tz = None
+        match = _DISPLAY_TIMEZONE.search(text)
+        if match:
+            display_tz = tz.gettz(match.group(1).strip())
+            if display_tz is None:
+                return None
+            text = text[:match.start()]
+        try:
+            parsed = parser.parse(text, fuzzy=True)
+        except (ValueError, OverflowError):
+            return None
+        if display_tz is not None and not parsed.tzinfo:
+            parsed = parsed.replace(tzinfo=display_tz)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def index_review_fields(pkg_dict):
+    """Add the review fields to a dataset being indexed as dedicated fields
+
+    ``review_status`` and ``reviewer_id`` are indexed as plain strings and
+    ``review_date`` and ``review_submitted_date`` (pending datasets only)
+    as Solr dates, so filters, facets and date sorting work on them
+    directly rather than on the generic ``extras_*`` text.
+    """
+    for field in ('review_status', 'reviewer_id'):
+        value = pkg_dict.get(field) or pkg_dict.get('extras_' + field)
+        if value:
+            pkg_dict[field] = value
+        else:
+            pkg_dict.pop(field, None)
+
+    review_date = parse_review_date(
+        pkg_dict.get('extras_review_date') or pkg_dict.get('review_date')
+    )
+    if review_date:
+        pkg_dict['review_date'] = review_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+    else:
+        pkg_dict.pop('review_date', None)
+
+    # When the dataset was (last) submitted for review, so the age of a
+    # submission does not reset on every edit of a pending dataset.
+    # Submissions made before review_submitted was stored are read from the
+    # review history.
+    submitted = None
+    if pkg_dict.get('review_status') == 'pending':
+        submitted = parse_review_date(
+            pkg_dict.get('extras_review_submitted') or pkg_dict.get('review_submitted')
+        )
+        if submitted is None and pkg_dict.get('id'):
+            submitted = stats.submission_times([pkg_dict['id']]).get(pkg_dict['id'])
+    if submitted:
+        pkg_dict['review_submitted_date'] = submitted.strftime('%Y-%m-%dT%H:%M:%SZ')
+    else:
+        pkg_dict.pop('review_submitted_date', None)
+    return pkg_dict
+
+
+def read_extras(package_ids, keys=REVIEW_FIELDS):
+    """Return ``{package_id: {key: value}}`` for the given extras keys"""
+    extras = dict((package_id, {}) for package_id in package_ids)
+    if not package_ids:
+        return extras
+    table = model.package_extra_table
+    q = select(table.c.package_id, table.c.key, table.c.value).where(
+        table.c.package_id.in_(list(package_ids)),
+        table.c.key.in_(list(keys)),
+    )
+    if 'state' in table.c:
+        q = q.where(table.c.state == 'active')
+    for package_id, key, value in model.Session.execute(q):
+        extras[package_id][key] = value
+    return extras
+
+
+def get_review_state(package_id):
+    """Read the review state of a package straight from its row and extras
+
+    This is a cheap alternative to ``package_show`` when only the privacy
+    and review fields are needed: two indexed queries and no dictization.
+    ``package_id`` can be an id or a name. Returns None if there is no such
+    package. Results are memoized for the current request.
+    """
+    if not package_id:
+        return None
+    memo = request_memo('review_state')
+    if memo is not None and package_id in memo:
+        return memo[package_id]
+
+    row = model.Session.query(
+        model.Package.id,
+        model.Package.name,
+        model.Package.title,
+        model.Package.owner_org,
+        model.Package.private,
+        model.Package.state,
+        model.Package.metadata_modified,
+    ).filter(
+        or_(model.Package.id == package_id, model.Package.name == package_id)
+    ).first()
+    if row is None:
+        return None
+
+    state = row._asdict()
+    if state['metadata_modified']:
+        state['metadata_modified'] = state['metadata_modified'].isoformat()
+    extras = read_extras([row.id])[row.id]
+    for field in REVIEW_FIELDS:
+        state[field] = extras.get(field)
+
+    if memo is not None:
+        memo[row.id] = memo[row.name] = state
+    return state
+
+
+def forget_review_state(*package_ids):
+    """Drop the memoized review state of the given packages"""
+    memo = request_memo('review_state')
+    if memo is None:
+        return
+    for package_id in package_ids:
+        state = memo.pop(package_id, None)
+        if state:
+            memo.pop(state['id'], None)
+            memo.pop(state['name'], None)
+
+
+def write_review_fields(package_ids, fields, private=None, modified=None,
+                        expected_modified=None):
+    """Write review extras (and optionally the private flag) of many packages
+
+    Only a handful of set-based statements are issued whatever the number
+    of packages. They are Core-level statements, so the ORM modification
+    hooks do not fire one synchronous Solr reindex per package: call
+    :py:func:`reindex_packages` once the transaction is committed.
+    Changes are left in the session for the caller to commit.
+
+    With ``expected_modified`` this is a compare-and-set: packages whose
+    ``metadata_modified`` changed in the meantime are left alone and
+    nothing else is written. Returns the number of packages written.
+    """
+    package_ids = list(package_ids)
+    if not package_ids:
+        return 0
+    forget_review_state(*package_ids)
+    modified = modified or datetime.datetime.utcnow()
+
+    values = {'metadata_modified': modified}
+    if private is not None:
+        values['private'] = private
+    update = model.package_table.update().where(
+        model.package_table.c.id.in_(package_ids)
+    )
+    if expected_modified is not None:
+        update = update.where(model.package_table.c.metadata_modified == expected_modified)
+    updated = model.Session.execute(update.values(**values)).rowcount
+    if not updated:
+        return 0
+
+    table = model.package_extra_table
+    active = {'state': 'active'} if 'state' in table.c else {}
+    existing = set(
+        (package_id, key) for package_id, key in model.Session.execute(
+            select(table.c.package_id, table.c.key).where(
+                table.c.package_id.in_(package_ids),
+                table.c.key.in_(list(fields)),
+            )
+        )
+    )
+    rows = []
+    for key, value in fields.items():
+        model.Session.execute(
+            table.update()
+            .where(table.c.package_id.in_(package_ids), table.c.key == key)
+            .values(value=_extra_value(value), **active)
+        )
+        rows.extend(
+            dict(id=make_uuid(), package_id=package_id, key=key,
+                 value=_extra_value(value), **active)
+            for package_id in package_ids
+            if (package_id, key) not in existing
+        )
+    if rows:
+        model.Session.execute(table.insert(), rows)
+    return updated
+
+
+def record_transitions(packages, review_status, user_id, created=None,
+                       resubmitted=()):
+    """Record that the given packages moved to ``review_status``
+
+    ``packages`` are dicts with the ``id``, ``owner_org`` and previous
+    ``review_status`` of each package (plus ``previous_owner_org`` if it
+    moved to another organization). ``resubmitted`` is the collection of
+    package ids that were resubmitted after a rejection.
+
+    Appends one row per package to the review history, updates the review
+    stats and reviewer assignments and bumps the review version, with a
+    fixed number of statements whatever the number of packages. Everything
+    is left in the session for the caller to commit, together with the
+    change it describes.
+    """
+    packages = list(packages)
+    if not packages:
+        return
+    created = created or datetime.datetime.utcnow()
+    resubmitted = set(resubmitted)
+    model.Session.execute(ReviewEvent.__table__.insert(), [
+        dict(id=make_uuid(), package_id=package['id'], user_id=user_id,
+             review_status=review_status,
+             resubmitted=package['id'] in resubmitted, created=created)
+        for package in packages
+    ])
+
+    stats.count_changes(
+        (package.get('previous_owner_org', package['owner_org']),
+         package['review_status'] or None,
+         package['owner_org'], review_status)
+        for package in packages
+    )
+
+    versions.bump(versions.REVIEW)
+
+    if review_status == 'pending':
+        assignment.assign([p['id'] for p in packages], exclude=user_id)
+    else:
+        assignment.unassign(p['id'] for p in packages)
+
+    if review_status in ('approved', 'rejected'):
+        reviewed = [p for p in packages if p['review_status'] == 'pending']
+        submitted = stats.submission_times([p['id'] for p in reviewed])
+        stats.record_latencies(
+            (package['owner_org'], (created - submitted[package['id']]).total_seconds())
+            for package in reviewed if package['id'] in submitted
+        )
+
+
+def create_activities(package_ids, user_id):
+    """Record a "changed package" activity for each package, if the
+    activity plugin is enabled"""
+    if not tk.plugin_loaded('activity'):
+        return
+    from ckanext.activity.model import Activity
+    packages = model.Session.query(model.Package).filter(
+        model.Package.id.in_(list(package_ids))
+    ).all()
+    for package in packages:
+        # The review fields were written with Core statements, make sure the
+        # activity is built from the new values and not from stale attributes
+        model.Session.expire(package)
+        model.Session.add(
+            Activity.activity_stream_item(package, 'changed', user_id)
+        )
+
+
+def _patch_data_dict(data_dict, fields, private, modified):
+    extras = [e for e in data_dict.get('extras', []) if e['key'] not in fields]
+    extras.extend(
+        {'key': key, 'value': _extra_value(value)}
+        for key, value in fields.items()
+    )
+    data_dict['extras'] = extras
+    if private is not None:
+        data_dict['private'] = private
+    if modified is not None:
+        data_dict['metadata_modified'] = modified.isoformat()
+    return data_dict
+
+
+def reindex_packages(package_ids, fields, private=None, modified=None,
+                     batch_size=50):
+    """Push review field changes to Solr with a single commit
+
+    Like core's bulk_update_* actions, the data dict already stored in the
+    index is patched and re-sent instead of dictizing every package again.
+    Packages missing from the index are rebuilt from the database, so this
+    must be called after the write has been committed.
+    """
+    package_ids = list(package_ids)
+    package_index = search.PackageSearchIndex()
+    query = search.PackageSearchQuery()
+    indexed = set()
+
+    for i in range(0, len(package_ids), batch_size):
+        batch = package_ids[i:i + batch_size]
+        q_dict = {
+            'q': ' OR '.join('id:"%s"' % package_id for package_id in batch),
+            'fl': 'data_dict',
+            'wt': 'json',
+            'fq': 'site_id:"%s"' % tk.config.get('ckan.site_id'),
+            'rows': len(batch),
+        }
+        for result in query.run(q_dict)['results']:
+            data_dict = _patch_data_dict(
+                json.loads(result['data_dict']), fields, private, modified
+            )
+            package_index.index_package(data_dict, defer_commit=True)
+            indexed.add(data_dict['id'])
+
+    missing = [package_id for package_id in package_ids if package_id not in indexed]
+    if missing:
+        log.debug('Rebuilding %d packages missing from the index', len(missing))
+        search.rebuild(package_ids=missing, defer_commit=True)
+
+    package_index.commit()
+
+
+def reviewed_package_ids(batch_size=1000):
+    """Yield, in batches, the ids of active datasets that have review fields"""
+    table = model.package_extra_table
+    package = model.package_table
+    q = select(table.c.package_id).distinct().join(
+        package, package.c.id == table.c.package_id
+    ).where(
+        table.c.key.in_(list(REVIEW_FIELDS)),
+        package.c.state == 'active',
+    ).order_by(table.c.package_id)
+    if 'state' in table.c:
+        q = q.where(table.c.state == 'active')
+
+    last_id = None
+    while True:
+        batch_q = q.limit(batch_size)
+        if last_id is not None:
+            batch_q = batch_q.where(table.c.package_id > last_id)
+        batch = [package_id for (package_id,) in model.Session.execute(batch_q)]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
@@ -0,0 +1,274 @@
+import bisect
+import logging
+from collections import Counter
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+import ckan.model as model
+
+from ckanext.onboarding_theodoro_bertol.lib.cache import MISSING, get_cache
+from ckanext.onboarding_theodoro_bertol.model import (
+    ReviewEvent, ReviewLatency, ReviewStat
+)
+
+log = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the time-to-review histogram buckets
+LATENCY_BUCKETS = (
+    3600, 4 * 3600, 12 * 3600, 86400, 2 * 86400, 3 * 86400,
+    7 * 86400, 14 * 86400, 30 * 86400,
+)
+OVERFLOW_BUCKET = -1
+
+
+def _org(owner_org):
+    return owner_org or ''
+
+
+def latency_bucket(seconds):
+    """Return the histogram bucket a review latency falls into"""
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else OVERFLOW_BUCKET
+
+
+def _upsert(table, keys, deltas):
+    rows = [
+        dict(zip(keys, key), count=delta)
+        for key, delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    stmt = insert(table.__table__).values(rows)
+    model.Session.execute(stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={'count': table.__table__.c.count + stmt.excluded['count']},
+    ))
+
+
+def _pending_cache():
+    return get_cache('pending_count', maxsize=1, ttl=30)
+
+
+def pending_count():
+    """Total number of datasets pending review
+
+    Cached at process level; the cache is dropped once a change of the
+    pending counters is committed and its short TTL covers changes made by
+    other processes.
+    """
+    cache = _pending_cache()
+    count = cache.get('pending')
+    if count is MISSING:
+        count = model.Session.query(
+            func.coalesce(func.sum(ReviewStat.count), 0)
+        ).filter(ReviewStat.review_status == 'pending').scalar()
+        cache.set('pending', count)
+    return count
+
+
+def count_changes(changes):
+    """Apply review status changes to the per-organization counters
+
+    ``changes`` is an iterable of ``(old_org, old_status, new_org,
+    new_status)`` tuples; a None status means the dataset was not (or is no
+    longer) in review. All changes are folded into one upsert statement.
+    Left in the session for the caller to commit.
+    """
+    deltas = Counter()
+    for old_org, old_status, new_org, new_status in changes:
+        if (_org(old_org), old_status) == (_org(new_org), new_status):
+            continue
+        if old_status:
+            deltas[(_org(old_org), old_status)] -= 1
+        if new_status:
+            deltas[(_org(new_org), new_status)] += 1
+    _upsert(ReviewStat, ('owner_org', 'review_status'), deltas)
+    if any(status == 'pending' for (_, status), delta in deltas.items() if delta):
+        # Dropped once committed: dropped now, a concurrent request could
+        # cache the old count again for the whole TTL
+        model.Session().info['onboarding_pending_changed'] = True
+
+
+@event.listens_for(model.Session, 'after_transaction_end')
+def _forget_pending_count(session, transaction):
+    # Savepoints end inside the transaction that commits the change. A
+    # rollback drops the cache for nothing, which is harmless
+    if transaction.parent is None and session.info.pop('onboarding_pending_changed', False):
+        _pending_cache().delete('pending')
+
+
+def record_latencies(latencies):
+    """Add ``(owner_org, seconds)`` review latencies to the histogram"""
+    deltas = Counter(
+        (_org(owner_org), latency_bucket(seconds)) for owner_org, seconds in latencies
+    )
+    _upsert(ReviewLatency, ('owner_org', 'bucket'), deltas)
+
+
+def submission_times(package_ids):
+    """Return ``{package_id: created}`` of the last submission of each package"""
+    if not package_ids:
+        return {}
+    return dict(model.Session.query(
+        ReviewEvent.package_id, func.max(ReviewEvent.created)
+    ).filter(
+        ReviewEvent.package_id.in_(list(package_ids)),
+        ReviewEvent.review_status == 'pending',
+    ).group_by(ReviewEvent.package_id))
+
+
+def _percentile(histogram, total, fraction):
+    target = total * fraction
+    seen = 0
+    for bucket in list(LATENCY_BUCKETS) + [OVERFLOW_BUCKET]:
+        seen += histogram.get(bucket, 0)
+        if seen >= target:
+            return None if bucket == OVERFLOW_BUCKET else bucket
+    return None
+
+
+def get_stats(owner_orgs=None):
+    """Read the review counters and time-to-review histogram
+
+    Reads one row per organization and status (or bucket), whatever the
+    number of datasets. ``owner_orgs`` restricts the result to those
+    organization ids.
+
+    Percentiles are the upper bound in seconds of the bucket they fall in,
+    None when there are no reviews or when they fall past the last bucket.
+    """
+    counts = model.Session.query(ReviewStat).filter(ReviewStat.count != 0)
+    latencies = model.Session.query(ReviewLatency)
+    if owner_orgs is not None:
+        counts = counts.filter(ReviewStat.owner_org.in_(owner_orgs))
+        latencies = latencies.filter(ReviewLatency.owner_org.in_(owner_orgs))
+
+    organizations = {}
+    totals = Counter()
+    for row in counts:
+        organizations.setdefault(row.owner_org, Counter())[row.review_status] += row.count
+        totals[row.review_status] += row.count
+
+    histogram = Counter()
+    for row in latencies:
+        histogram[row.bucket] += row.count
+
+    return {
+        'totals': dict(totals),
+        'organizations': dict(
+            (owner_org, dict(counts)) for owner_org, counts in organizations.items()
+        ),
+        'time_to_review': _time_to_review(histogram),
+    }
+
+
+def _time_to_review(histogram):
+    reviewed = sum(histogram.values())
+    return {
+        'count': reviewed,
+        'p50': _percentile(histogram, reviewed, 0.5) if reviewed else None,
+        'p90': _percentile(histogram, reviewed, 0.9) if reviewed else None,
+        'p99': _percentile(histogram, reviewed, 0.99) if reviewed else None,
+        'buckets': dict(
+            (str(bucket), histogram.get(bucket, 0))
+            for bucket in list(LATENCY_BUCKETS) + [OVERFLOW_BUCKET]
+        ),
+    }
+
+
+def get_range_stats(reviewed_after=None, reviewed_before=None, owner_orgs=None):
+    """Count the reviews made between ``reviewed_after`` (included) and
+    ``reviewed_before`` (excluded), naive UTC datetimes or None
+
+    The counters only know the current state, so this reads the review
+    history through its ``created`` index: the cost grows with the number
+    of reviews in the range, not of datasets. Reviews are counted under
+    the current organization of their dataset, restricted to
+    ``owner_orgs`` if given. The time to review of a review that directly
+    follows a submission is measured from it, in the buckets of
+    :py:func:`get_stats`.
+    """
+    earlier = aliased(ReviewEvent)
+    previous = model.Session.query(func.max(earlier.created)).filter(
+        earlier.package_id == ReviewEvent.package_id,
+        earlier.created < ReviewEvent.created,
+    )
+    submitted = previous.filter(earlier.review_status == 'pending')
+    q = model.Session.query(
+        func.coalesce(model.Package.owner_org, ''),
+        ReviewEvent.review_status,
+        ReviewEvent.created,
+        previous.correlate(ReviewEvent).scalar_subquery(),
+        submitted.correlate(ReviewEvent).scalar_subquery(),
+    ).join(
+        model.Package, model.Package.id == ReviewEvent.package_id
+    ).filter(
+        ReviewEvent.review_status.in_(('approved', 'rejected')),
+    )
+    if reviewed_after:
+        q = q.filter(ReviewEvent.created >= reviewed_after)
+    if reviewed_before:
+        q = q.filter(ReviewEvent.created < reviewed_before)
+    if owner_orgs is not None:
+        q = q.filter(model.Package.owner_org.in_(owner_orgs))
+
+    organizations = {}
+    totals = Counter()
+    histogram = Counter()
+    for owner_org, review_status, created, last, last_submitted in q.yield_per(10000):
+        organizations.setdefault(owner_org, Counter())[review_status] += 1
+        totals[review_status] += 1
+        if last_submitted is not None and last_submitted == last:
+            histogram[latency_bucket((created - last_submitted).total_seconds())] += 1
+
+    return {
+        'totals': dict(totals),
+        'organizations': dict(
+            (owner_org, dict(counts)) for owner_org, counts in organizations.items()
+        ),
+        'time_to_review': _time_to_review(histogram),
+    }
+
+
+def rebuild_stats():
+    """Recompute the counters and histogram from the datasets and history
+
+    Meant to repair drift (e.g. after datasets were purged or edited
+    outside of the actions). This is the only O(datasets) operation, run
+    from the ``rebuild-stats`` command. Commits.
+    """
+    extra = model.package_extra_table
+    counts = model.Session.query(
+        func.coalesce(model.Package.owner_org, ''), extra.c.value, func.count()
+    ).join(
+        extra, extra.c.package_id == model.Package.id
+    ).filter(
+        model.Package.state == 'active',
+        extra.c.key == 'review_status',
+        extra.c.value != '',
+    ).group_by(func.coalesce(model.Package.owner_org, ''), extra.c.value).all()
+
+    owner_orgs = dict(model.Session.query(model.Package.id, model.Package.owner_org))
+    latencies = Counter()
+    submitted = {}
+    events = model.Session.query(
+        ReviewEvent.package_id, ReviewEvent.review_status, ReviewEvent.created
+    ).order_by(ReviewEvent.package_id, ReviewEvent.created).yield_per(10000)
+    for package_id, review_status, created in events:
+        if review_status == 'pending':
+            submitted[package_id] = created
+        elif package_id in submitted:
+            seconds = (created - submitted.pop(package_id)).total_seconds()
+            latencies[(_org(owner_orgs.get(package_id)), latency_bucket(seconds))] += 1
+
+    model.Session.query(ReviewStat).delete()
+    model.Session.query(ReviewLatency).delete()
+    _upsert(ReviewStat, ('owner_org', 'review_status'),
+            dict(((owner_org, status), count) for owner_org, status, count in counts))
+    _upsert(ReviewLatency, ('owner_org', 'bucket'), latencies)
+    model.repo.commit()
+    _pending_cache().delete('pending')
+    log.info("Rebuilt review stats: %d counters, %d reviews in the histogram",
+             len(counts), sum(latencies.values()))
+    return {'counters': len(counts), 'reviews': sum(latencies.values())}
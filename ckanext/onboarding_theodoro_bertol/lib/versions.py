@@ -0,0 +1,67 @@
+import datetime
+import hashlib
+
+from flask import make_response, request, session
+from sqlalchemy.dialects.postgresql import insert
+import ckan.model as model
+
+from ckanext.onboarding_theodoro_bertol.model import Version
+
+REVIEW = 'review'
+ROSTER = 'roster'
+DATASETS = 'datasets'
+
+
+def bump(*names):
+    """Increment the given version counters
+
+    Left in the session, so the new version is only visible once the
+    change it describes is committed.
+    """
+    now = datetime.datetime.utcnow()
+    table = Version.__table__
+    for name in names:
+        stmt = insert(table).values(name=name, version=1, modified=now)
+        model.Session.execute(stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': table.c.version + 1, 'modified': now},
+        ))
+
+
+def get_versions(*names):
+    """Return ``{name: (version, modified)}`` with a single primary key lookup"""
+    rows = model.Session.query(Version.name, Version.version, Version.modified).filter(
+        Version.name.in_(names)
+    )
+    versions = dict((name, (0, None)) for name in names)
+    for name, version, modified in rows:
+        versions[name] = (version, modified)
+    return versions
+
+
+def conditional_get(names, render, *vary):
+    """Answer a GET with ``304 Not Modified`` if the page did not change
+
+    The ETag is built from the given version counters and the ``vary``
+    values (user, query string...) and Last-Modified from the newest
+    counter. ``render`` is only called when the client copy is stale.
+    Pages with pending flash messages are always rendered.
+    """
+    versions = get_versions(*names)
+    parts = [str(versions[name][0]) for name in names] + [str(v) for v in vary]
+    etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+    modified = [m for _, m in versions.values() if m]
+    last_modified = max(modified).replace(tzinfo=datetime.timezone.utc) if modified else None
+
+    if etag in request.if_none_match and not session.get('_flashes'):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            # Redirects and errors are not cacheable
+            return response
+        if last_modified:
+            response.last_modified = last_modified
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
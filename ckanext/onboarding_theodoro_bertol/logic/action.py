@@ -1,11 +1,91 @@
+import base64
+import datetime
+import json
 from ckan.plugins import toolkit as tk
 from ckan.common import _
+import ckan.authz as authz
+import ckan.lib.search as search
 import ckan.logic as logic
 import ckan.model as model
+from sqlalchemy import or_
 import logging
+from ckanext.onboarding_theodoro_bertol.lib import (
+    assignment, claims, metrics, stats, versions
+)
+from ckanext.onboarding_theodoro_bertol.lib.cache import cache_stats
+from ckanext.onboarding_theodoro_bertol.lib.helpers import invalidate_reviewer_cache
+from ckanext.onboarding_theodoro_bertol.lib.notifications import enqueue_resubmission_notification
+from ckanext.onboarding_theodoro_bertol.lib.review_state import (
+    create_activities, forget_review_state, get_review_state, parse_review_date,
+    read_extras, record_transitions, reindex_packages, write_review_fields
+)
+from ckanext.onboarding_theodoro_bertol.model import Reviewer, ReviewAssignment, ReviewEvent
 
 log = logging.getLogger(__name__)
 
+def _set_reviewer_permission(users, granted, granted_by=None):
+    """Add or remove the given users from the reviewer table
+
+    Changes are left in the session; callers are expected to commit.
+    """
+    user_ids = [user.id for user in users]
+    if granted:
+        existing = set(
+            user_id for (user_id,) in model.Session.query(Reviewer.user_id)
+            .filter(Reviewer.user_id.in_(user_ids))
+        )
+        for user_id in user_ids:
+            if user_id not in existing:
+                model.Session.add(Reviewer(user_id=user_id, granted_by=granted_by))
+    else:
+        model.Session.query(Reviewer).filter(
+            Reviewer.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+
+    versions.bump(versions.ROSTER)
+
+    # Keep the legacy flag in plugin_extras in sync (assign a new dict so
+    # the JSON column is flagged as modified)
+    for user in users:
+        if granted or (user.plugin_extras and 'review_permission' in user.plugin_extras):
+            user.plugin_extras = dict(user.plugin_extras or {}, review_permission=granted)
+            model.Session.add(user)
+
+def _set_reviewer_permission_many(context, data_dict, granted):
+    usernames = data_dict.get('usernames')
+    if isinstance(usernames, str):
+        usernames = usernames.replace(',', ' ').split()
+    usernames = [u for u in (usernames or []) if u]
+    if not usernames:
+        raise logic.ValidationError({'usernames': [_('At least one username is required')]})
+
+    users = model.Session.query(model.User).filter(
+        or_(model.User.id.in_(usernames), model.User.name.in_(usernames))
+    ).all()
+    found = {}
+    for user in users:
+        found[user.id] = user
+        found[user.name] = user
+
+    _set_reviewer_permission(users, granted, granted_by=context.get('user'))
+    model.repo.commit()
+
+    results = []
+    not_found = []
+    for username in usernames:
+        user = found.get(username)
+        if user:
+            invalidate_reviewer_cache(user.id, user.name)
+            results.append({'username': username, 'user': user.name, 'success': True})
+        else:
+            not_found.append(username)
+            results.append({'username': username, 'success': False,
+                            'error': _('User not found')})
+
+    log.info("%s reviewer permission for %d users (%d not found)",
+             'Granted' if granted else 'Revoked', len(users), len(not_found))
+    return {'success': True, 'results': results, 'not_found': not_found}
+
 def user_reviewer_grant(context, data_dict):
     """Grant reviewer permission to a user"""
     tk.check_access('user_reviewer_grant', context, data_dict)
@@ -18,13 +98,9 @@ def user_reviewer_grant(context, data_dict):
     if not user:
         raise logic.NotFound(_('User not found'))
 
-    # Store reviewer permission in plugin_extras
-    if not user.plugin_extras:
-        user.plugin_extras = {}
-
-    user.plugin_extras['review_permission'] = True
-    user.save()
+    _set_reviewer_permission([user], True, granted_by=context.get('user'))
     model.repo.commit()
+    invalidate_reviewer_cache(user.id, user.name, username)
 
     log.info(f"Granted reviewer permission to user: {username}")
     return {'success': True, 'user': user.name}
@@ -41,19 +117,124 @@ def user_reviewer_revoke(context, data_dict):
     if not user:
         raise logic.NotFound(_('User not found'))
 
-    # Remove reviewer permission from plugin_extras
-    if user.plugin_extras and 'review_permission' in user.plugin_extras:
-        user.plugin_extras['review_permission'] = False
-        user.save()
-        model.repo.commit()
+    _set_reviewer_permission([user], False)
+    model.repo.commit()
+    invalidate_reviewer_cache(user.id, user.name, username)
 
     log.info(f"Revoked reviewer permission from user: {username}")
     return {'success': True, 'user': user.name}
 
+def user_reviewer_grant_many(context, data_dict):
+    """Grant reviewer permission to several users in one transaction
+
+    ``usernames`` is a list of user names or ids. Names that do not match a
+    user are reported in ``not_found`` instead of failing the whole call.
+    """
+    tk.check_access('user_reviewer_grant_many', context, data_dict)
+    return _set_reviewer_permission_many(context, data_dict, True)
+
+def user_reviewer_revoke_many(context, data_dict):
+    """Revoke reviewer permission from several users in one transaction"""
+    tk.check_access('user_reviewer_revoke_many', context, data_dict)
+    return _set_reviewer_permission_many(context, data_dict, False)
+
+def _bump_roster(context):
+    # Names, states and sysadmin flags shown on the roster may have changed
+    versions.bump(versions.ROSTER)
+    if not context.get('defer_commit'):
+        model.repo.commit()
 
 @tk.chained_action
-def package_create(up_func, context, data_dict):
-    """Override package_create to set default review status"""
+def user_update(up_func, context, data_dict):
+    """Override user_update to drop the cached reviewer status"""
+    user = model.User.get(data_dict.get('id') or '')
+    old_name = user.name if user else None
+
+    result = up_func(context, data_dict)
+    invalidate_reviewer_cache(result.get('id'), result.get('name'), old_name, data_dict.get('id'))
+    _bump_roster(context)
+    return result
+
+@tk.chained_action
+def user_delete(up_func, context, data_dict):
+    """Override user_delete to drop the cached reviewer status"""
+    user = model.User.get(data_dict.get('id') or '')
+
+    result = up_func(context, data_dict)
+    if user:
+        invalidate_reviewer_cache(user.id, user.name)
+    invalidate_reviewer_cache(data_dict.get('id'))
+    _bump_roster(context)
+    return result
+
+def review_cache_stats(context, data_dict):
+    """Return hit/miss counters of the review caches"""
+    tk.check_access('review_cache_stats', context, data_dict)
+    return cache_stats()
+
+
+def _readable_packages(context):
+    """SQL condition restricting ``model.Package`` rows to the datasets the
+    context user can ``package_show``, or None if they can read them all
+
+    Public active datasets, private ones of the organizations the user is
+    a member of and, when collaborators are enabled, the datasets the user
+    collaborates on.
+    """
+    if context.get('ignore_auth') or authz.is_sysadmin(context.get('user')):
+        return None
+    user_id = _context_user_id(context)
+    org_ids = [org['id'] for org in tk.get_action('organization_list_for_user')(
+        {'user': context.get('user'), 'ignore_auth': True},
+        {'id': user_id, 'permission': 'read'}
+    )] if user_id else []
+    visible = [model.Package.private == False]  # noqa: E712
+    if org_ids:
+        visible.append(model.Package.owner_org.in_(org_ids))
+    if user_id and authz.check_config_permission('allow_dataset_collaborators'):
+        visible.append(model.Package.id.in_(
+            model.Session.query(model.PackageMember.package_id).filter(
+                model.PackageMember.user_id == user_id
+            )
+        ))
+    return (model.Package.state == 'active') & or_(*visible)
+
+def _context_user_id(context):
+    user = context.get('auth_user_obj') or context.get('user_obj')
+    if not user and context.get('user'):
+        user = model.User.get(context['user'])
+    return user.id if user else context.get('user')
+
+def _track_review_state(context, result, previous=None, submitted=False,
+                        resubmitted=False):
+    """Record a submission in the history and keep the review stats in
+    line with the review state the dataset ended up in"""
+    previous = previous or {}
+    # Every dataset is on the unfiltered review list, in review or not
+    versions.bump(versions.DATASETS)
+    if submitted:
+        record_transitions([{
+            'id': result['id'],
+            'owner_org': result.get('owner_org'),
+            'previous_owner_org': previous.get('owner_org'),
+            'review_status': previous.get('review_status'),
+        }], 'pending', _context_user_id(context),
+            resubmitted=[result['id']] if resubmitted else ())
+    else:
+        old = (previous.get('owner_org'), previous.get('review_status') or None)
+        new = (result.get('owner_org'), result.get('review_status') or None)
+        if result.get('state') == 'deleted':
+            new = (None, None)
+        # Nothing to track if not in review before nor after
+        if old[1] or new[1]:
+            stats.count_changes([old + new])
+            if old[1] == 'pending' and new[1] != 'pending':
+                assignment.unassign([result['id']])
+            versions.bump(versions.REVIEW)
+    if not context.get('defer_commit'):
+        model.repo.commit()
+
+def _apply_review_defaults(data_dict):
     # New datasets start as private without review status
     # Review is only needed when changing from private to public
     if 'private' not in data_dict:
@@ -62,59 +243,236 @@ def package_create(up_func, context, data_dict):
     # Only set review status if creating as public
     if not data_dict.get('private', True):
         data_dict['review_status'] = 'pending'
+        data_dict['review_submitted'] = datetime.datetime.utcnow().isoformat()
         data_dict['private'] = True  # Force private until approved
-        log.info(f"Dataset creation attempted as public - setting to pending review")
+        return True
+    return False
+
+@tk.chained_action
+@metrics.timed('package_create')
+def package_create(up_func, context, data_dict):
+    """Override package_create to set default review status
+
+    With ``onboarding_bulk`` in the context (see
+    :py:func:`package_create_many`) the caller has applied the defaults
+    already, and batches logging and review tracking itself.
+    """
+    if context.get('onboarding_bulk'):
+        return up_func(context, data_dict)
+
+    submitted = _apply_review_defaults(data_dict)
+    if submitted:
+        log.info("Dataset creation attempted as public - setting to pending review")
 
     result = up_func(context, data_dict)
-    log.info(f"Created dataset {result['id']} - private: {result.get('private')}, review_status: {result.get('review_status', 'none')}")
+    _track_review_state(context, result, submitted=result.get('review_status') == 'pending')
+    log.info("Created dataset %s - private: %s, review_status: %s",
+             result['id'], result.get('private'), result.get('review_status', 'none'))
     return result
 
+def _skip_automatic_indexing():
+    # Core indexes the packages changed in a transaction when it commits,
+    # with a Solr commit each (IDomainObjectModification, fed from the
+    # session's _object_cache). Emptying the cache of this thread's session
+    # skips that for everything flushed so far, the caller indexes it
+    session = model.Session()
+    session.flush()
+    for objects in getattr(session, '_object_cache', {}).values():
+        objects.clear()
+
+def _finish_bulk_batch(context, created, submitted):
+    """Record the submissions of a batch, commit it and index it with a
+    single Solr commit"""
+    if submitted:
+        owner_orgs = dict(model.Session.query(model.Package.id, model.Package.owner_org).filter(
+            model.Package.id.in_(submitted)
+        ))
+        record_transitions(
+            [{'id': package_id, 'owner_org': owner_orgs.get(package_id), 'review_status': None}
+             for package_id in submitted],
+            'pending', _context_user_id(context)
+        )
+    if created:
+        versions.bump(versions.DATASETS)
+    _skip_automatic_indexing()
+    model.repo.commit()
+    if created:
+        search.rebuild(package_ids=created, defer_commit=True, quiet=True)
+        search.commit()
+
+def package_create_many(context, data_dict):
+    """Create many datasets in bulk ingest mode
+
+    :param datasets: list of dataset dicts, as passed to ``package_create``
+    :param batch_size: number of datasets committed and indexed together
+        (optional, defaults to
+        ``ckanext.onboarding_theodoro_bertol.bulk.batch_size``)
+
+    Every dataset goes through ``package_create`` (validation, auth and the
+    private/review_status defaults), in a savepoint so that a dataset that
+    fails does not stop the others, but without per-dataset logging, commit
+    nor synchronous Solr index. Each batch is committed with its
+    submissions for review, then indexed with a single Solr commit. Other
+    ``IDomainObjectModification`` plugins are not notified of the new
+    datasets.
+
+    :returns: the ``ids`` of the created datasets and the ``errors`` of the
+        failed ones (``index`` in ``datasets`` and ``error``)
+    """
+    tk.check_access('package_create_many', context, data_dict)
+
+    datasets = data_dict.get('datasets')
+    if not isinstance(datasets, list) or not datasets:
+        raise logic.ValidationError({'datasets': [_('A list of datasets is required')]})
+    try:
+        batch_size = int(data_dict.get('batch_size') or tk.config.get(
+            'ckanext.onboarding_theodoro_bertol.bulk.batch_size', 500))
+    except ValueError:
+        raise logic.ValidationError({'batch_size': [_('Invalid batch size')]})
+    if batch_size < 1:
+        raise logic.ValidationError({'batch_size': [_('Invalid batch size')]})
+
+    package_create = tk.get_action('package_create')
+    ids, errors = [], []
+    created, submitted = [], []
+    for index, dataset in enumerate(datasets):
+        item_context = {
+            'user': context.get('user'),
+            'auth_user_obj': context.get('auth_user_obj'),
+            'ignore_auth': context.get('ignore_auth', False),
+            'return_id_only': True,
+            'defer_commit': True,
+            'onboarding_bulk': True,
+        }
+        dataset = dict(dataset)
+        pending = _apply_review_defaults(dataset)
+        savepoint = model.Session.begin_nested()
+        try:
+            package_id = package_create(item_context, dataset)
+            _skip_automatic_indexing()
+            savepoint.commit()
+        except logic.ValidationError as e:
+            savepoint.rollback()
+            errors.append({'index': index, 'error': e.error_dict})
+            continue
+        except Exception as e:
+            savepoint.rollback()
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        ids.append(package_id)
+        created.append(package_id)
+        if pending:
+            submitted.append(package_id)
+
+        if len(created) >= batch_size:
+            _finish_bulk_batch(context, created, submitted)
+            created, submitted = [], []
+
+    _finish_bulk_batch(context, created, submitted)
+
+    log.info("Bulk created %d datasets (%d failed)", len(ids), len(errors))
+    return {'ids': ids, 'errors': errors}
+
 @tk.chained_action
+@metrics.timed('package_update')
 def package_update(up_func, context, data_dict):
     """Override package_update to handle private->public transitions"""
     dataset_id = data_dict.get('id')
 
-    # Get current dataset state
+    # Get current review state (cheap read of the package row and extras,
+    # core will do the full package_show itself)
+    current_dataset = None
+    submitted = resubmitted = False
     if dataset_id:
         try:
-            package_show = tk.get_action('package_show')
-            current_dataset = package_show(context, {'id': dataset_id})
+            current_dataset = get_review_state(dataset_id)
+        except Exception as e:
+            log.warning(f"Could not check current dataset state: {e}")
 
+    if current_dataset:
+        try:
             # Check if user is trying to change from private to public
-            current_private = current_dataset.get('private', True)
+            current_private = current_dataset['private']
             new_private = data_dict.get('private')
-            current_review_status = current_dataset.get('review_status', '')
+            current_review_status = current_dataset['review_status'] or ''
 
             # If changing from private to public and not already approved
             if current_private and new_private is False and current_review_status != 'approved':
                 # Set to pending review and keep private
                 data_dict['review_status'] = 'pending'
+                data_dict['review_submitted'] = datetime.datetime.utcnow().isoformat()
                 data_dict['private'] = True
+                submitted = True
                 log.info(f"Dataset {dataset_id} attempted to go public - setting to pending review")
 
                 # Store that user tried to make it public (for later notification)
-                if 'reviewer_id' in current_dataset:
-                    data_dict['last_reviewer_id'] = current_dataset.get('reviewer_id')
+                if current_dataset['reviewer_id'] is not None:
+                    data_dict['last_reviewer_id'] = current_dataset['reviewer_id']
 
             # If dataset was rejected and is being edited, set back to pending
             elif current_review_status == 'rejected' and 'title' in data_dict:
                 data_dict['review_status'] = 'pending'
+                data_dict['review_submitted'] = datetime.datetime.utcnow().isoformat()
+                submitted = resubmitted = True
                 log.info(f"Rejected dataset {dataset_id} modified - setting back to pending review")
 
                 # Store last reviewer for notification
-                if 'reviewer_id' in current_dataset:
-                    data_dict['last_reviewer_id'] = current_dataset.get('reviewer_id')
+                if current_dataset['reviewer_id'] is not None:
+                    data_dict['last_reviewer_id'] = current_dataset['reviewer_id']
                     data_dict['resubmitted_after_rejection'] = True
 
         except Exception as e:
             log.warning(f"Could not check current dataset state: {e}")
 
     result = up_func(context, data_dict)
+    forget_review_state(result['id'])
+    _track_review_state(context, result, current_dataset, submitted, resubmitted)
     log.info(f"Updated dataset {result['id']} - private: {result.get('private')}, review_status: {result.get('review_status', 'none')}")
     return result
 
+@tk.chained_action
+def package_delete(up_func, context, data_dict):
+    """Override package_delete to take the dataset out of the review stats"""
+    current_dataset = get_review_state(data_dict.get('id'))
+
+    result = up_func(context, data_dict)
+    if current_dataset and current_dataset['state'] != 'deleted':
+        forget_review_state(current_dataset['id'])
+        _track_review_state(context, {'id': current_dataset['id'], 'state': 'deleted'},
+                            current_dataset)
+    return result
+
+def _bump_datasets(up_func, context, data_dict):
+    # Core's bulk updates change the datasets without package_update
+    result = up_func(context, data_dict)
+    versions.bump(versions.DATASETS)
+    model.repo.commit()
+    return result
+
+@tk.chained_action
+def bulk_update_private(up_func, context, data_dict):
+    """Override bulk_update_private to bump the datasets version"""
+    return _bump_datasets(up_func, context, data_dict)
+
+@tk.chained_action
+def bulk_update_public(up_func, context, data_dict):
+    """Override bulk_update_public to bump the datasets version"""
+    return _bump_datasets(up_func, context, data_dict)
+
+@tk.chained_action
+def bulk_update_delete(up_func, context, data_dict):
+    """Override bulk_update_delete to bump the datasets version"""
+    return _bump_datasets(up_func, context, data_dict)
+
+@metrics.timed('dataset_review')
 def dataset_review(context, data_dict):
-    """Review a dataset - approve or reject"""
+    """Review a dataset - approve or reject
+
+    Only the review fields and the private flag are written, with a
+    targeted update instead of a full package_patch, followed by a single
+    reindex of the dataset. A "changed package" activity is still recorded.
+    Returns the new review state of the dataset.
+    """
     tk.check_access('dataset_review', context, data_dict)
 
     dataset_id = data_dict.get('id')
@@ -127,68 +485,529 @@ def dataset_review(context, data_dict):
         raise logic.ValidationError({'review_status': [_('Review status must be approved or rejected')]})
 
     # Get the dataset
-    package_show = tk.get_action('package_show')
-    dataset = package_show(context, {'id': dataset_id})
+    dataset = get_review_state(dataset_id)
+    if not dataset or dataset['state'] == 'deleted':
+        raise logic.NotFound(_('Dataset not found'))
+
+    # Compare-and-set on metadata_modified: the version the reviewer saw
+    # (expected_modified, e.g. from the dataset page) or the one just read
+    expected_modified = _parse_modified(dataset['metadata_modified'])
+    if data_dict.get('expected_modified'):
+        if _parse_modified(data_dict['expected_modified'], 'expected_modified') != expected_modified:
+            raise logic.ValidationError({'expected_modified': [_(
+                'The dataset was modified since it was loaded, reload it and try again'
+            )]})
+
+    reviewer_id = _context_user_id(context)
+
+    # Fail fast if another reviewer holds the dataset
+    if not claims.claim(dataset['id'], reviewer_id):
+        model.Session.rollback()
+        raise logic.ValidationError({'id': [_('The dataset is being reviewed by another reviewer')]})
+
+    # Update review status. review_date is stored as UTC ISO-8601 so it
+    # can be sorted and range-filtered
+    modified = datetime.datetime.utcnow()
+    fields = {
+        'review_status': review_status,
+        'reviewer_id': reviewer_id,
+        'review_date': modified.isoformat(),
+        'resubmitted_after_rejection': False
+    }
 
-    # Get reviewer user
-    user = context.get('auth_user_obj') or context.get('user_obj')
-    reviewer_id = user.id if user else context.get('user')
+    # If approved, make the dataset public
+    private = False if review_status == 'approved' else None
+
+    # Update the dataset
+    resubmitted = tk.asbool(dataset.get('resubmitted_after_rejection') or False)
+    if not write_review_fields([dataset['id']], fields, private=private, modified=modified,
+                               expected_modified=expected_modified):
+        # Somebody else changed the dataset between our read and write
+        model.Session.rollback()
+        forget_review_state(dataset['id'])
+        raise logic.ValidationError({'expected_modified': [_(
+            'The dataset was modified by someone else, reload it and try again'
+        )]})
+    claims.release([dataset['id']])
+    record_transitions([dataset], review_status, reviewer_id, created=modified,
+                       resubmitted=[dataset['id']] if resubmitted else ())
+    create_activities([dataset['id']], reviewer_id or 'not logged in')
+    model.repo.commit()
+    reindex_packages([dataset['id']], fields, private=private, modified=modified)
 
-    # Check if this was resubmitted after rejection and send notification
-    if dataset.get('resubmitted_after_rejection') and dataset.get('last_reviewer_id'):
+    # Notify the last reviewer if this was resubmitted after rejection. The
+    # e-mail is sent by a background job, off the request path
+    if resubmitted and dataset.get('last_reviewer_id'):
         try:
-            # Send email notification to last reviewer
-            _send_resubmission_notification(dataset.get('last_reviewer_id'), dataset)
+            enqueue_resubmission_notification(dataset.get('last_reviewer_id'), dataset)
         except Exception as e:
-            log.warning(f"Could not send email notification: {e}")
+            log.warning("Could not queue email notification: %s", e)
+
+    log.info(f"Dataset {dataset_id} review status changed to: {review_status} by reviewer: {reviewer_id}")
+    return get_review_state(dataset['id'])
 
-    # Update review status
-    update_data = {
-        'id': dataset_id,
+def _parse_modified(value, key='metadata_modified'):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise logic.ValidationError({key: [_('Invalid date')]})
+
+def dataset_review_claim(context, data_dict):
+    """Take (or renew) the review lease on a dataset
+
+    Other reviewers cannot review the dataset until the lease is released
+    or expires (``ckanext.onboarding_theodoro_bertol.claim.ttl`` seconds).
+
+    :returns: ``id``, ``user_id`` and ``expires`` of the lease
+    """
+    tk.check_access('dataset_review_claim', context, data_dict)
+
+    dataset = get_review_state(data_dict.get('id'))
+    if not dataset or dataset['state'] == 'deleted':
+        raise logic.NotFound(_('Dataset not found'))
+
+    user_id = _context_user_id(context)
+    expires = claims.claim(dataset['id'], user_id)
+    if not expires:
+        model.Session.rollback()
+        raise logic.ValidationError({'id': [_('The dataset is being reviewed by another reviewer')]})
+    model.repo.commit()
+    return {'id': dataset['id'], 'user_id': user_id, 'expires': expires.isoformat()}
+
+def dataset_review_release(context, data_dict):
+    """Release the current user's review lease on a dataset"""
+    tk.check_access('dataset_review_release', context, data_dict)
+
+    dataset = get_review_state(data_dict.get('id'))
+    if not dataset:
+        raise logic.NotFound(_('Dataset not found'))
+    claims.release([dataset['id']], _context_user_id(context))
+    model.repo.commit()
+    return {'success': True}
+
+def dataset_review_bulk(context, data_dict):
+    """Approve or reject many datasets at once
+
+    ``ids`` is a list of dataset ids or names and ``review_status`` is applied
+    to all of them. Access is checked once, the review fields of every
+    dataset are written in a single transaction and the search index is
+    updated in one batch. Unknown ids are reported in ``not_found`` and
+    datasets claimed by other reviewers in ``conflicts``.
+    """
+    tk.check_access('dataset_review_bulk', context, data_dict)
+
+    ids = data_dict.get('ids')
+    if isinstance(ids, str):
+        ids = ids.replace(',', ' ').split()
+    ids = [i for i in (ids or []) if i]
+    review_status = data_dict.get('review_status')
+
+    if not ids:
+        raise logic.ValidationError({'ids': [_('At least one dataset ID is required')]})
+
+    if review_status not in ['approved', 'rejected']:
+        raise logic.ValidationError({'review_status': [_('Review status must be approved or rejected')]})
+
+    packages = model.Session.query(
+        model.Package.id, model.Package.name, model.Package.title,
+        model.Package.owner_org
+    ).filter(
+        or_(model.Package.id.in_(ids), model.Package.name.in_(ids)),
+        model.Package.state == 'active'
+    ).all()
+    found = set()
+    for package in packages:
+        found.update((package.id, package.name))
+    not_found = [i for i in ids if i not in found]
+
+    reviewer_id = _context_user_id(context)
+
+    # Leave alone the datasets another reviewer is working on
+    claimed = claims.claimed_by_others([package.id for package in packages], reviewer_id)
+    conflicts = [package.id for package in packages if package.id in claimed]
+    packages = [package for package in packages if package.id not in claimed]
+    package_ids = [package.id for package in packages]
+
+    resubmitted = []
+    resubmissions = []
+    extras = read_extras(
+        package_ids, ('review_status', 'resubmitted_after_rejection', 'last_reviewer_id')
+    )
+    for package in packages:
+        package_extras = extras[package.id]
+        if tk.asbool(package_extras.get('resubmitted_after_rejection') or False):
+            resubmitted.append(package.id)
+            if package_extras.get('last_reviewer_id'):
+                resubmissions.append((package_extras['last_reviewer_id'], package))
+
+    modified = datetime.datetime.utcnow()
+    fields = {
         'review_status': review_status,
         'reviewer_id': reviewer_id,
-        'review_date': tk.h.render_datetime(tk.h.date_str_to_datetime(''), with_hours=True),
-        'resubmitted_after_rejection': False
+        'review_date': modified.isoformat(),
+        'resubmitted_after_rejection': False,
     }
+    private = False if review_status == 'approved' else None
+
+    if package_ids:
+        write_review_fields(package_ids, fields, private=private, modified=modified)
+        claims.release(package_ids)
+        record_transitions(
+            [{'id': package.id, 'owner_org': package.owner_org,
+              'review_status': extras[package.id].get('review_status')}
+             for package in packages],
+            review_status, reviewer_id, created=modified, resubmitted=resubmitted
+        )
+        create_activities(package_ids, reviewer_id or 'not logged in')
+        model.repo.commit()
+        reindex_packages(package_ids, fields, private=private, modified=modified)
 
-    # If approved, make the dataset public
-    if review_status == 'approved':
-        update_data['private'] = False
+    for last_reviewer_id, package in resubmissions:
+        try:
+            enqueue_resubmission_notification(
+                last_reviewer_id, {'id': package.id, 'title': package.title}
+            )
+        except Exception as e:
+            log.warning("Could not queue email notification: %s", e)
 
-    # Update the dataset
-    package_patch = tk.get_action('package_patch')
-    result = package_patch(context, update_data)
+    log.info("%d datasets review status changed to: %s by reviewer: %s",
+             len(package_ids), review_status, reviewer_id)
+    return {
+        'success': True,
+        'review_status': review_status,
+        'datasets': package_ids,
+        'not_found': not_found,
+        'conflicts': conflicts,
+    }
 
-    log.info(f"Dataset {dataset_id} review status changed to: {review_status} by reviewer: {reviewer_id}")
-    return result
+REVIEW_STATUSES = ('pending', 'approved', 'rejected')
+
+def _encode_cursor(timestamp, item_id):
+    raw = json.dumps([timestamp, item_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
 
-def _send_resubmission_notification(reviewer_id, dataset):
-    """Send email notification to reviewer when dataset is resubmitted"""
+def _decode_cursor(cursor):
+    try:
+        # Cursors sent to the action API may be any JSON value
+        if not isinstance(cursor, str):
+            raise TypeError(cursor)
+        modified, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(item_id, str):
+            raise TypeError(item_id)
+        modified = datetime.datetime.strptime(modified[:19], '%Y-%m-%dT%H:%M:%S').replace(
+            microsecond=int((modified[20:26] or '0').ljust(6, '0'))
+        )
+    except (TypeError, ValueError):
+        raise logic.ValidationError({'cursor': [_('Invalid cursor')]})
+    return modified, item_id
+
+def _solr_phrase(value):
+    # Dataset ids are not necessarily UUIDs (sysadmins can choose them)
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+def _parse_limit(data_dict):
+    """Page size requested in ``data_dict['limit']``, defaulting to and
+    capped by the review queue page size options"""
+    config = tk.config
+    page_size = tk.asint(config.get('ckanext.onboarding_theodoro_bertol.review_queue.page_size', 50))
+    max_page_size = tk.asint(config.get('ckanext.onboarding_theodoro_bertol.review_queue.max_page_size', 1000))
     try:
-        # Get reviewer user
-        user_show = tk.get_action('user_show')
-        reviewer = user_show({'ignore_auth': True}, {'id': reviewer_id})
+        limit = min(int(data_dict.get('limit') or page_size), max_page_size)
+    except (TypeError, ValueError):
+        raise logic.ValidationError({'limit': [_('Invalid limit')]})
+    if limit < 1:
+        raise logic.ValidationError({'limit': [_('Invalid limit')]})
+    return limit
+
+def _parse_date_param(data_dict, key):
+    value = data_dict.get(key)
+    if not value:
+        return None
+    parsed = parse_review_date(value)
+    if parsed is None:
+        raise logic.ValidationError({key: [_('Invalid date')]})
+    return parsed
+
+def _solr_date(value):
+    # Solr stores dates with millisecond precision
+    return value.strftime('%Y-%m-%dT%H:%M:%S.') + '%03dZ' % (value.microsecond // 1000)
+
+def dataset_review_queue(context, data_dict):
+    """Page through the datasets in review, most recently modified first
+
+    :param review_status: only return datasets with this status (optional)
+    :param limit: page size (optional, defaults to the
+        ``ckanext.onboarding_theodoro_bertol.review_queue.page_size`` option)
+    :param cursor: the ``next_cursor`` returned with the previous page
+        (optional)
+    :param reviewed_after: only datasets reviewed at or after this UTC
+        ISO-8601 timestamp (optional)
+    :param reviewed_before: only datasets reviewed before this UTC
+        ISO-8601 timestamp (optional)
+    :param pending_for_hours: only datasets that were submitted for review
+        at least this many hours ago and are still pending (optional)
+
+    Pages are cut with keyset pagination on ``(metadata_modified, id)``
+    rather than with a row offset, so every page costs the same however
+    deep into the queue it is.
+
+    Private datasets are included through the user's permission labels,
+    so the search only returns datasets the user can see and no
+    per-dataset authorization check is needed afterwards.
+
+    :returns: ``count`` and ``facets`` for the whole queue, the ``results``
+        of this page and the ``next_cursor`` (None on the last page)
+    """
+    tk.check_access('dataset_review_queue', context, data_dict)
+
+    limit = _parse_limit(data_dict)
+
+    review_status = data_dict.get('review_status')
+    if review_status and review_status not in REVIEW_STATUSES:
+        raise logic.ValidationError({'review_status': [_('Unknown review status')]})
+
+    fq_list = []
+    if review_status:
+        fq_list.append('review_status:"%s"' % review_status)
+
+    reviewed_after = _parse_date_param(data_dict, 'reviewed_after')
+    reviewed_before = _parse_date_param(data_dict, 'reviewed_before')
+    if reviewed_after or reviewed_before:
+        fq_list.append('review_date:[%s TO %s}' % (
+            _solr_date(reviewed_after) if reviewed_after else '*',
+            _solr_date(reviewed_before) if reviewed_before else '*',
+        ))
+
+    pending_for_hours = data_dict.get('pending_for_hours')
+    if pending_for_hours not in (None, ''):
+        try:
+            pending_for_hours = int(pending_for_hours)
+        except ValueError:
+            raise logic.ValidationError({'pending_for_hours': [_('Invalid number of hours')]})
+        if pending_for_hours < 0:
+            raise logic.ValidationError({'pending_for_hours': [_('Invalid number of hours')]})
+        fq_list.append('review_status:"pending"')
+        fq_list.append('review_submitted_date:[* TO NOW-%dHOURS]' % pending_for_hours)
+
+    package_search = tk.get_action('package_search')
+    search_params = {
+        'q': '*:*',
+        'fq_list': list(fq_list),
+        'include_private': True,
+        'rows': limit + 1,
+        'sort': 'metadata_modified desc, id desc',
+        'facet.field': ['review_status'],
+    }
+
+    cursor = data_dict.get('cursor')
+    totals = None
+    if cursor:
+        modified, last_id = _decode_cursor(cursor)
+        modified = _solr_date(modified)
+        search_params['fq_list'].append(
+            '(metadata_modified:{* TO %s} OR (metadata_modified:"%s" AND id:{* TO %s}))'
+            % (modified, modified, _solr_phrase(last_id))
+        )
+        totals = package_search(dict(context), {
+            'q': '*:*', 'fq_list': fq_list, 'include_private': True,
+            'rows': 0, 'facet.field': ['review_status']
+        })
+
+    search_results = package_search(dict(context), search_params)
+    results = search_results['results']
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = _encode_cursor(results[-1]['metadata_modified'], results[-1]['id'])
+
+    totals = totals or search_results
+    return {
+        'count': totals['count'],
+        'facets': totals.get('facets', {}).get('review_status', {}),
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+
+def dataset_review_history(context, data_dict):
+    """Page through the review history of a dataset or of a user, newest first
 
-        if reviewer.get('email'):
-            # Prepare email
-            subject = f"Dataset Resubmitted for Review: {dataset.get('title', 'Untitled')}"
-            body = f"""
-            Hello {reviewer.get('display_name', 'Reviewer')},
+    :param id: id or name of the dataset (either this or ``user_id``)
+    :param user_id: id or name of the reviewer or submitter
+    :param limit: page size (optional, defaults to the review queue page
+        size)
+    :param cursor: the ``next_cursor`` returned with the previous page
+        (optional)
 
-            A dataset you previously reviewed has been modified and resubmitted for review.
+    Only the history table is read, using its (package_id, created) or
+    (user_id, created) index, and pages are cut with keyset pagination on
+    ``(created, id)``. The history of a user only lists the datasets the
+    caller can read.
 
-            Dataset: {dataset.get('title', 'Untitled')}
-            URL: {tk.url_for('dataset.read', id=dataset['id'], _external=True)}
+    :returns: the ``results`` of this page and the ``next_cursor`` (None on
+        the last page)
+    """
+    tk.check_access('dataset_review_history', context, data_dict)
 
-            The dataset is now pending your review.
+    dataset_id = data_dict.get('id')
+    user_id = data_dict.get('user_id')
+    if bool(dataset_id) == bool(user_id):
+        raise logic.ValidationError({'id': [_('Provide either a dataset id or a user_id')]})
+
+    limit = _parse_limit(data_dict)
+
+    q = model.Session.query(ReviewEvent)
+    if dataset_id:
+        package = model.Session.query(model.Package.id).filter(
+            or_(model.Package.id == dataset_id, model.Package.name == dataset_id)
+        ).first()
+        if not package:
+            raise logic.NotFound(_('Dataset not found'))
+        tk.check_access('package_show', context, {'id': package.id})
+        q = q.filter(ReviewEvent.package_id == package.id)
+    else:
+        user = model.User.get(user_id)
+        if not user:
+            raise logic.NotFound(_('User not found'))
+        q = q.filter(ReviewEvent.user_id == user.id)
+        readable = _readable_packages(context)
+        if readable is not None:
+            q = q.join(model.Package, model.Package.id == ReviewEvent.package_id).filter(readable)
+
+    cursor = data_dict.get('cursor')
+    if cursor:
+        created, last_id = _decode_cursor(cursor)
+        q = q.filter(or_(
+            ReviewEvent.created < created,
+            (ReviewEvent.created == created) & (ReviewEvent.id < last_id)
+        ))
+
+    events = q.order_by(ReviewEvent.created.desc(), ReviewEvent.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = _encode_cursor(events[-1].created.isoformat(), events[-1].id)
+
+    return {
+        'results': [{
+            'id': event.id,
+            'package_id': event.package_id,
+            'user_id': event.user_id,
+            'review_status': event.review_status,
+            'resubmitted': event.resubmitted,
+            'created': event.created.isoformat(),
+        } for event in events],
+        'next_cursor': next_cursor,
+    }
+
+def review_stats(context, data_dict):
+    """Review counts per organization and time-to-review percentiles
+
+    :param owner_org: only return the stats of this organization (id or
+        name, optional)
+    :param reviewed_after: also count the reviews made at or after this
+        UTC ISO-8601 timestamp (optional)
+    :param reviewed_before: also count the reviews made before this UTC
+        ISO-8601 timestamp (optional)
+
+    Read from counters maintained on every review state change, so the
+    cost depends on the number of organizations, not of datasets. The
+    reviews of a date range are read from the review history, at a cost
+    that grows with the number of reviews in the range.
+
+    :returns: ``totals`` per review status, the counts per status of each
+        organization in ``organizations`` (keyed by organization name, ``""``
+        for datasets without one) and ``time_to_review`` with the number of
+        reviews, the p50/p90/p99 upper bounds in seconds and the histogram.
+        With a date range, ``reviewed`` holds the same three keys for the
+        reviews made in it
+    """
+    tk.check_access('review_stats', context, data_dict)
+
+    owner_orgs = None
+    owner_org = data_dict.get('owner_org')
+    if owner_org:
+        group = model.Group.get(owner_org)
+        if not group or not group.is_organization:
+            raise logic.NotFound(_('Organization not found'))
+        owner_orgs = [group.id]
+    reviewed_after = _parse_date_param(data_dict, 'reviewed_after')
+    reviewed_before = _parse_date_param(data_dict, 'reviewed_before')
+
+    result = stats.get_stats(owner_orgs)
+    if reviewed_after or reviewed_before:
+        result['reviewed'] = stats.get_range_stats(reviewed_after, reviewed_before, owner_orgs)
+
+    parts = [result] + ([result['reviewed']] if 'reviewed' in result else [])
+    org_ids = set(org_id for part in parts for org_id in part['organizations'] if org_id)
+    names = dict(model.Session.query(model.Group.id, model.Group.name).filter(
+        model.Group.id.in_(org_ids)
+    )) if org_ids else {}
+    for part in parts:
+        part['organizations'] = dict(
+            (names.get(org_id, org_id), counts)
+            for org_id, counts in part['organizations'].items()
+        )
+    return result
 
-            Best regards,
-            CKAN System
-            """
+def dataset_review_assignments(context, data_dict):
+    """Page through the pending datasets assigned to a reviewer, oldest first
 
-            # Send email using CKAN's mailer
-            from ckan.lib.mailer import send_mail
-            send_mail(reviewer['email'], subject, body)
-            log.info(f"Sent resubmission notification to {reviewer['email']} for dataset {dataset['id']}")
-    except Exception as e:
-        log.error(f"Failed to send email notification: {e}")
+    :param user_id: id or name of the reviewer (optional, defaults to the
+        current user)
+    :param limit: page size (optional, defaults to the review queue page
+        size)
+    :param cursor: the ``next_cursor`` returned with the previous page
+        (optional)
+
+    Served from the assignment table's (reviewer_id, assigned) index. Only
+    the datasets the caller can read are listed.
+
+    :returns: the ``results`` of this page (``id``, ``name``, ``title`` and
+        ``assigned`` of each dataset) and the ``next_cursor``
+    """
+    tk.check_access('dataset_review_assignments', context, data_dict)
+
+    user = model.User.get(data_dict.get('user_id') or context.get('user') or '')
+    if not user:
+        raise logic.NotFound(_('User not found'))
+
+    limit = _parse_limit(data_dict)
+
+    q = model.Session.query(
+        ReviewAssignment.package_id, ReviewAssignment.assigned,
+        model.Package.name, model.Package.title
+    ).join(
+        model.Package, model.Package.id == ReviewAssignment.package_id
+    ).filter(
+        ReviewAssignment.reviewer_id == user.id,
+        model.Package.state == 'active'
+    )
+    readable = _readable_packages(context)
+    if readable is not None:
+        q = q.filter(readable)
+
+    cursor = data_dict.get('cursor')
+    if cursor:
+        assigned, last_id = _decode_cursor(cursor)
+        q = q.filter(or_(
+            ReviewAssignment.assigned > assigned,
+            (ReviewAssignment.assigned == assigned) & (ReviewAssignment.package_id > last_id)
+        ))
+
+    rows = q.order_by(ReviewAssignment.assigned, ReviewAssignment.package_id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].assigned.isoformat(), rows[-1].package_id)
+
+    return {
+        'results': [{
+            'id': row.package_id,
+            'name': row.name,
+            'title': row.title,
+            'assigned': row.assigned.isoformat(),
+        } for row in rows],
+        'next_cursor': next_cursor,
+    }
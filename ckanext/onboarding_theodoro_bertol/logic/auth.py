@@ -16,6 +16,33 @@ def user_reviewer_revoke(context, data_dict):
         return {'success': True}
     return {'success': False, 'msg': _('Only sysadmins can revoke reviewer permissions')}
 
+def user_reviewer_grant_many(context, data_dict):
+    """Same rule as granting a single reviewer"""
+    return user_reviewer_grant(context, data_dict)
+
+def user_reviewer_revoke_many(context, data_dict):
+    """Same rule as revoking a single reviewer"""
+    return user_reviewer_revoke(context, data_dict)
+
+def package_create_many(context, data_dict):
+    """Same rule as creating a dataset; package_create also checks each one"""
+    return authz.is_authorized('package_create', context, {})
+
+def review_cache_stats(context, data_dict):
+    """Only sysadmins can inspect the review caches"""
+    user = context['user']
+    if authz.is_sysadmin(user):
+        return {'success': True}
+    return {'success': False, 'msg': _('Only sysadmins can inspect the review caches')}
+
+def review_export(context, data_dict):
+    """Only sysadmins can export the review state of every dataset"""
+    user = context['user']
+    if authz.is_sysadmin(user):
+        return {'success': True}
+    return {'success': False, 'msg': _('Only sysadmins can export the review data')}
+
+
 
 def dataset_review(context, data_dict):
     """Only users with reviewer permissions can review datasets"""
@@ -29,3 +56,38 @@ def dataset_review(context, data_dict):
         'success': False,
         'msg': _('User {} not authorized to review datasets').format(user)
     }
+
+def dataset_review_bulk(context, data_dict):
+    """Same rule as reviewing a single dataset"""
+    return dataset_review(context, data_dict)
+
+def dataset_review_claim(context, data_dict):
+    """Only reviewers can claim datasets"""
+    return dataset_review(context, data_dict)
+
+def dataset_review_release(context, data_dict):
+    """Only reviewers can release their claims"""
+    return dataset_review(context, data_dict)
+
+def dataset_review_queue(context, data_dict):
+    """Only reviewers can browse the review queue"""
+    return dataset_review(context, data_dict)
+
+def dataset_review_history(context, data_dict):
+    """Only reviewers can read the review history"""
+    return dataset_review(context, data_dict)
+
+def review_stats(context, data_dict):
+    """Only reviewers can read the review stats"""
+    return dataset_review(context, data_dict)
+
+def dataset_review_assignments(context, data_dict):
+    """Reviewers can list their own assignments, sysadmins anyone's"""
+    user = context['user']
+    other = data_dict.get('user_id')
+    if other and other != user and not authz.is_sysadmin(user):
+        user_id = authz.get_user_id_for_username(user, allow_none=True)
+        if other != user_id:
+            return {'success': False,
+                    'msg': _('Only sysadmins can list the assignments of other reviewers')}
+    return dataset_review(context, data_dict)
@@ -0,0 +1,48 @@
+"""Add reviewer table
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2026-10-18 09:12:44.310512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_reviewer',
+        sa.Column('user_id', sa.UnicodeText,
+                  sa.ForeignKey('user.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('granted_by', sa.UnicodeText, nullable=True),
+        sa.Column('created', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    # Sysadmins are reviewers too; a partial index keeps the roster
+    # query from scanning the whole user table to find them
+    op.create_index(
+        'idx_onboarding_user_sysadmin', 'user', ['id'],
+        postgresql_where=sa.text('sysadmin')
+    )
+
+    # Backfill from the flag previously stored in user.plugin_extras
+    op.execute(
+        """
+        INSERT INTO onboarding_reviewer (user_id, created)
+        SELECT id, now() AT TIME ZONE 'utc' FROM "user"
+        WHERE (plugin_extras ->> 'review_permission')::boolean IS TRUE
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('idx_onboarding_user_sysadmin', table_name='user')
+    op.drop_table('onboarding_reviewer')
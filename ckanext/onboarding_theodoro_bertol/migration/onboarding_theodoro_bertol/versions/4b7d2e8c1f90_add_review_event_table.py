@@ -0,0 +1,84 @@
+"""Add review event table
+
+Revision ID: 4b7d2e8c1f90
+Revises: e2b94d17f6a3
+Create Date: 2026-10-18 16:21:09.557302
+
+"""
+import datetime
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d2e8c1f90'
+down_revision = 'e2b94d17f6a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_review_event',
+        sa.Column('id', sa.UnicodeText, primary_key=True),
+        sa.Column('package_id', sa.UnicodeText, nullable=False),
+        sa.Column('user_id', sa.UnicodeText, nullable=True),
+        sa.Column('review_status', sa.UnicodeText, nullable=False),
+        sa.Column('resubmitted', sa.Boolean, nullable=False,
+                  server_default=sa.false()),
+        sa.Column('created', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    op.create_index(
+        'ix_onboarding_review_event_package_created',
+        'onboarding_review_event', ['package_id', 'created']
+    )
+    op.create_index(
+        'ix_onboarding_review_event_user_created',
+        'onboarding_review_event', ['user_id', 'created']
+    )
+
+    # Seed the history with the last review of every dataset, as stored in
+    # its extras (review_date was converted to ISO by the previous revision)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        """
+        SELECT s.package_id, s.value, r.value, d.value
+        FROM package_extra s
+        LEFT JOIN package_extra r
+            ON r.package_id = s.package_id AND r.key = 'reviewer_id'
+        LEFT JOIN package_extra d
+            ON d.package_id = s.package_id AND d.key = 'review_date'
+        WHERE s.key = 'review_status' AND s.value IN ('approved', 'rejected')
+        """
+    )).fetchall()
+
+    events = []
+    for package_id, review_status, reviewer_id, review_date in rows:
+        try:
+            created = datetime.datetime.fromisoformat(review_date)
+        except (TypeError, ValueError):
+            continue
+        events.append({
+            'id': str(uuid.uuid4()),
+            'package_id': package_id,
+            'user_id': reviewer_id or None,
+            'review_status': review_status,
+            'resubmitted': False,
+            'created': created,
+        })
+    if events:
+        conn.execute(sa.text(
+            """
+            INSERT INTO onboarding_review_event
+                (id, package_id, user_id, review_status, resubmitted, created)
+            VALUES
+                (:id, :package_id, :user_id, :review_status, :resubmitted, :created)
+            """
+        ), events)
+
+
+def downgrade():
+    op.drop_table('onboarding_review_event')
@@ -0,0 +1,30 @@
+"""Add review event created index
+
+Revision ID: 5e8b2f0d4c93
+Revises: f03c9a71e8b6
+Create Date: 2026-10-18 23:12:48.205117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b2f0d4c93'
+down_revision = 'f03c9a71e8b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The existing indexes lead with package_id or user_id, range queries
+    # over all events (e.g. the reindex --since command) need this one
+    op.create_index(
+        'ix_onboarding_review_event_created',
+        'onboarding_review_event', ['created']
+    )
+
+
+def downgrade():
+    op.drop_index(
+        'ix_onboarding_review_event_created', 'onboarding_review_event'
+    )
@@ -0,0 +1,38 @@
+"""Add notification failure table
+
+Revision ID: 8a4e61c0d2f5
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 11:02:17.845213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e61c0d2f5'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_notification_failure',
+        sa.Column('id', sa.UnicodeText, primary_key=True),
+        sa.Column('kind', sa.UnicodeText, nullable=False),
+        sa.Column('recipient_id', sa.UnicodeText, nullable=True),
+        sa.Column('package_id', sa.UnicodeText, nullable=True),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='1'),
+        sa.Column('error', sa.UnicodeText, nullable=True),
+        sa.Column('created', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    op.create_index(
+        'ix_onboarding_notification_failure_package_id',
+        'onboarding_notification_failure', ['package_id']
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_notification_failure')
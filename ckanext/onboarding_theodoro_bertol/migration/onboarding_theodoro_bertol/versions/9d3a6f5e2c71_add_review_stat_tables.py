@@ -0,0 +1,47 @@
+"""Add review stat tables
+
+Revision ID: 9d3a6f5e2c71
+Revises: 4b7d2e8c1f90
+Create Date: 2026-10-18 17:48:53.201946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3a6f5e2c71'
+down_revision = '4b7d2e8c1f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_review_stat',
+        sa.Column('owner_org', sa.UnicodeText, primary_key=True),
+        sa.Column('review_status', sa.UnicodeText, primary_key=True),
+        sa.Column('count', sa.Integer, nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'onboarding_review_latency',
+        sa.Column('owner_org', sa.UnicodeText, primary_key=True),
+        sa.Column('bucket', sa.Integer, primary_key=True),
+        sa.Column('count', sa.Integer, nullable=False, server_default='0'),
+    )
+    # Populate the counters from the current extras; the latency histogram
+    # is filled by `ckan onboarding_theodoro_bertol rebuild-stats`
+    op.execute(
+        """
+        INSERT INTO onboarding_review_stat (owner_org, review_status, count)
+        SELECT coalesce(p.owner_org, ''), e.value, count(*)
+        FROM package p JOIN package_extra e ON e.package_id = p.id
+        WHERE p.state = 'active' AND e.key = 'review_status' AND e.value <> ''
+        GROUP BY coalesce(p.owner_org, ''), e.value
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_review_latency')
+    op.drop_table('onboarding_review_stat')
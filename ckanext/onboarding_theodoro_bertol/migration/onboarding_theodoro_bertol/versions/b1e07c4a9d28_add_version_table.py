@@ -0,0 +1,37 @@
+"""Add version table
+
+Revision ID: b1e07c4a9d28
+Revises: 9d3a6f5e2c71
+Create Date: 2026-10-18 19:05:41.730388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1e07c4a9d28'
+down_revision = '9d3a6f5e2c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_version',
+        sa.Column('name', sa.UnicodeText, primary_key=True),
+        sa.Column('version', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('modified', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    op.execute(
+        """
+        INSERT INTO onboarding_version (name, version, modified)
+        VALUES ('review', 1, now() AT TIME ZONE 'utc'),
+               ('roster', 1, now() AT TIME ZONE 'utc')
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_version')
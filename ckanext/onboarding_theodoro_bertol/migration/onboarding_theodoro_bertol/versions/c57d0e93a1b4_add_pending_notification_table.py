@@ -0,0 +1,37 @@
+"""Add pending notification table
+
+Revision ID: c57d0e93a1b4
+Revises: 8a4e61c0d2f5
+Create Date: 2026-10-18 13:40:02.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c57d0e93a1b4'
+down_revision = '8a4e61c0d2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_pending_notification',
+        sa.Column('id', sa.UnicodeText, primary_key=True),
+        sa.Column('kind', sa.UnicodeText, nullable=False),
+        sa.Column('recipient_id', sa.UnicodeText, nullable=False),
+        sa.Column('package_id', sa.UnicodeText, nullable=False),
+        sa.Column('title', sa.UnicodeText, nullable=True),
+        sa.Column('created', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    op.create_index(
+        'ix_onboarding_pending_notification_recipient_id',
+        'onboarding_pending_notification', ['recipient_id']
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_pending_notification')
@@ -0,0 +1,34 @@
+"""Add review assignment table
+
+Revision ID: d6f18b3e5a47
+Revises: b1e07c4a9d28
+Create Date: 2026-10-18 20:33:12.604519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6f18b3e5a47'
+down_revision = 'b1e07c4a9d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_review_assignment',
+        sa.Column('package_id', sa.UnicodeText, primary_key=True),
+        sa.Column('reviewer_id', sa.UnicodeText, nullable=False),
+        sa.Column('assigned', sa.DateTime, nullable=False,
+                  server_default=sa.func.now()),
+    )
+    op.create_index(
+        'ix_onboarding_review_assignment_reviewer_assigned',
+        'onboarding_review_assignment', ['reviewer_id', 'assigned']
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_review_assignment')
@@ -0,0 +1,77 @@
+"""Convert review_date extras to UTC ISO-8601
+
+Revision ID: e2b94d17f6a3
+Revises: c57d0e93a1b4
+Create Date: 2026-10-18 15:02:37.904211
+
+"""
+import datetime
+import logging
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil import parser, tz
+
+log = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94d17f6a3'
+down_revision = 'c57d0e93a1b4'
+branch_labels = None
+depends_on = None
+
+_DISPLAY_TIMEZONE = re.compile(r'\(([^()]+)\)\s*$')
+
+
+def _to_iso(value):
+    # Older versions stored the localized display string, rendered in the
+    # display timezone, e.g. "October 18, 2026, 09:30 (America/Sao_Paulo)"
+    display_tz = None
+    match = _DISPLAY_TIMEZONE.search(value)
+    if match:
+        display_tz = tz.gettz(match.group(1).strip())
+        if display_tz is None:
+            return None
+        value = value[:match.start()]
+    try:
+        parsed = parser.parse(value, fuzzy=True)
+    except (ValueError, OverflowError):
+        return None
+    if display_tz is not None and not parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=display_tz)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def upgrade():
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, package_id, value FROM package_extra "
+        "WHERE key = 'review_date' AND value <> ''"
+    )).fetchall()
+
+    updates = []
+    for extra_id, package_id, value in rows:
+        converted = _to_iso(value)
+        if converted is None:
+            # Leave the value as it is rather than lose it: it is not
+            # indexed as a date nor matched by range queries, but can still
+            # be fixed by hand
+            log.warning("Could not convert review_date %r of dataset %s",
+                        value, package_id)
+            continue
+        if converted != value:
+            updates.append({'id': extra_id, 'value': converted})
+
+    if updates:
+        conn.execute(
+            sa.text("UPDATE package_extra SET value = :value WHERE id = :id"),
+            updates
+        )
+
+
+def downgrade():
+    # ISO timestamps are still rendered correctly by older versions
+    pass
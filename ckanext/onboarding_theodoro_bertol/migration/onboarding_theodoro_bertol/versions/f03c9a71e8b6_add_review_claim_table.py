@@ -0,0 +1,29 @@
+"""Add review claim table
+
+Revision ID: f03c9a71e8b6
+Revises: d6f18b3e5a47
+Create Date: 2026-10-18 21:47:26.318840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f03c9a71e8b6'
+down_revision = 'd6f18b3e5a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'onboarding_review_claim',
+        sa.Column('package_id', sa.UnicodeText, primary_key=True),
+        sa.Column('user_id', sa.UnicodeText, nullable=False),
+        sa.Column('expires', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('onboarding_review_claim')
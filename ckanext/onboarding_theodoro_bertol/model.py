@@ -0,0 +1,144 @@
+import datetime
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, UnicodeText
+)
+import ckan.model as model
+from ckan.model.types import make_uuid
+from ckan.plugins import toolkit as tk
+
+
+class Reviewer(tk.BaseModel):
+    """Users holding reviewer permission, one row per user
+
+    Sysadmins are reviewers implicitly and do not need a row here.
+    """
+    __tablename__ = 'onboarding_reviewer'
+
+    user_id = Column(UnicodeText, ForeignKey(model.User.id, ondelete='CASCADE'),
+                     primary_key=True)
+    granted_by = Column(UnicodeText, nullable=True)
+    created = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    @classmethod
+    def roster(cls):
+        """Query of active users that can review: explicit reviewers plus sysadmins"""
+        reviewers = model.Session.query(model.User).join(
+            cls, cls.user_id == model.User.id
+        ).filter(model.User.state == 'active')
+        sysadmins = model.Session.query(model.User).filter(
+            model.User.sysadmin == True,
+            model.User.state == 'active'
+        )
+        return reviewers.union(sysadmins)
+
+
+class NotificationFailure(tk.BaseModel):
+    """Dead-letter record of a notification that failed on every attempt"""
+    __tablename__ = 'onboarding_notification_failure'
+
+    id = Column(UnicodeText, primary_key=True, default=make_uuid)
+    kind = Column(UnicodeText, nullable=False)
+    recipient_id = Column(UnicodeText, nullable=True)
+    package_id = Column(UnicodeText, nullable=True, index=True)
+    attempts = Column(Integer, nullable=False, default=1)
+    error = Column(UnicodeText, nullable=True)
+    created = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class PendingNotification(tk.BaseModel):
+    """Notification waiting to be sent as part of a reviewer digest"""
+    __tablename__ = 'onboarding_pending_notification'
+
+    id = Column(UnicodeText, primary_key=True, default=make_uuid)
+    kind = Column(UnicodeText, nullable=False)
+    recipient_id = Column(UnicodeText, nullable=False, index=True)
+    package_id = Column(UnicodeText, nullable=False)
+    title = Column(UnicodeText, nullable=True)
+    created = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ReviewEvent(tk.BaseModel):
+    """Append-only history of review decisions and resubmissions
+
+    ``review_status`` is the status the dataset moved to: ``approved`` or
+    ``rejected`` for a review, ``pending`` when it was submitted (or
+    resubmitted) for review. ``user_id`` is the reviewer or the submitter.
+    """
+    __tablename__ = 'onboarding_review_event'
+    __table_args__ = (
+        Index('ix_onboarding_review_event_package_created', 'package_id', 'created'),
+        Index('ix_onboarding_review_event_user_created', 'user_id', 'created'),
+        Index('ix_onboarding_review_event_created', 'created'),
+    )
+
+    id = Column(UnicodeText, primary_key=True, default=make_uuid)
+    package_id = Column(UnicodeText, nullable=False)
+    user_id = Column(UnicodeText, nullable=True)
+    review_status = Column(UnicodeText, nullable=False)
+    resubmitted = Column(Boolean, nullable=False, default=False)
+    created = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ReviewStat(tk.BaseModel):
+    """Number of active datasets per organization and review status
+
+    Maintained incrementally on every review state change. Datasets
+    without an organization are counted under an empty ``owner_org``.
+    """
+    __tablename__ = 'onboarding_review_stat'
+
+    owner_org = Column(UnicodeText, primary_key=True)
+    review_status = Column(UnicodeText, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ReviewLatency(tk.BaseModel):
+    """Histogram of the time between submission and review, per organization
+
+    ``bucket`` is the upper bound of the bucket in seconds, ``-1`` for
+    reviews slower than the largest bound.
+    """
+    __tablename__ = 'onboarding_review_latency'
+
+    owner_org = Column(UnicodeText, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Version(tk.BaseModel):
+    """Counters bumped whenever a set of objects changes
+
+    ``review`` changes with the review state of any dataset and ``roster``
+    with the list of reviewers. Used as cheap cache validators.
+    """
+    __tablename__ = 'onboarding_version'
+
+    name = Column(UnicodeText, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    modified = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ReviewAssignment(tk.BaseModel):
+    """Reviewer a pending dataset is assigned to, one row per dataset"""
+    __tablename__ = 'onboarding_review_assignment'
+    __table_args__ = (
+        Index('ix_onboarding_review_assignment_reviewer_assigned', 'reviewer_id', 'assigned'),
+    )
+
+    package_id = Column(UnicodeText, primary_key=True)
+    reviewer_id = Column(UnicodeText, nullable=False)
+    assigned = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ReviewClaim(tk.BaseModel):
+    """Lease a reviewer holds on a dataset while reviewing it
+
+    Expired leases are simply overwritten by the next claim, so they never
+    need to be swept.
+    """
+    __tablename__ = 'onboarding_review_claim'
+
+    package_id = Column(UnicodeText, primary_key=True)
+    user_id = Column(UnicodeText, nullable=False)
+    expires = Column(DateTime, nullable=False)
@@ -5,23 +5,31 @@ from ckanext.onboarding_theodoro_bertol.views.home import home
 from ckanext.onboarding_theodoro_bertol.views.admin import admin
 from ckanext.onboarding_theodoro_bertol.views.dataset import dataset
 from ckanext.onboarding_theodoro_bertol.views.reviews import reviews
+from ckanext.onboarding_theodoro_bertol.views.metrics import metrics
 # from ckanext.onboarding_theodoro_bertol.views.user import user
 from ckanext.onboarding_theodoro_bertol.lib.helpers import get_helpers
 import ckanext.onboarding_theodoro_bertol.logic.action as actions
 import ckanext.onboarding_theodoro_bertol.logic.auth as auth
+import ckanext.onboarding_theodoro_bertol.cli as cli
+from ckanext.onboarding_theodoro_bertol.lib.review_state import index_review_fields
+from ckanext.onboarding_theodoro_bertol.lib import metrics as metrics_lib
 
 log = logging.getLogger(__name__)
 
+@toolkit.blanket.config_declarations
 class OnboardingTheodoroBertolPlugin(
     plugins.SingletonPlugin, 
     toolkit.DefaultDatasetForm
 ):
     plugins.implements(plugins.IConfigurer)
+    plugins.implements(plugins.IConfigurable)
     plugins.implements(plugins.IBlueprint)
     plugins.implements(plugins.ITemplateHelpers)
     plugins.implements(plugins.IActions)
     plugins.implements(plugins.IAuthFunctions)
     plugins.implements(plugins.IDatasetForm, inherit=False)
+    plugins.implements(plugins.IClick)
+    plugins.implements(plugins.IPackageController, inherit=True)
     
     # IConfigurer
     def update_config(self, config_):
@@ -31,10 +39,14 @@ class OnboardingTheodoroBertolPlugin(
         toolkit.add_resource("assets", "onboarding_theodoro_bertol")
         log.info("OnboardingTheodoroBertolPlugin: template and asset directories configured")
     
+    # IConfigurable
+    def configure(self, config_):
+        metrics_lib.configure(config_)
+
     # IBlueprint
     def get_blueprint(self):
         log.info("OnboardingTheodoroBertolPlugin: get_blueprint called")
-        return [home, admin, dataset]
+        return [home, admin, dataset, reviews, metrics]
     
     # ITemplateHelpers
     def get_helpers(self):
@@ -46,9 +58,26 @@ class OnboardingTheodoroBertolPlugin(
         return {
             'user_reviewer_grant': actions.user_reviewer_grant,
             'user_reviewer_revoke': actions.user_reviewer_revoke,
+            'user_reviewer_grant_many': actions.user_reviewer_grant_many,
+            'user_reviewer_revoke_many': actions.user_reviewer_revoke_many,
             'package_create': actions.package_create,
+            'package_create_many': actions.package_create_many,
             'package_update': actions.package_update,
+            'package_delete': actions.package_delete,
+            'bulk_update_private': actions.bulk_update_private,
+            'bulk_update_public': actions.bulk_update_public,
+            'bulk_update_delete': actions.bulk_update_delete,
             'dataset_review': actions.dataset_review,
+            'dataset_review_bulk': actions.dataset_review_bulk,
+            'dataset_review_claim': actions.dataset_review_claim,
+            'dataset_review_release': actions.dataset_review_release,
+            'dataset_review_queue': actions.dataset_review_queue,
+            'dataset_review_history': actions.dataset_review_history,
+            'review_stats': actions.review_stats,
+            'dataset_review_assignments': actions.dataset_review_assignments,
+            'user_update': actions.user_update,
+            'user_delete': actions.user_delete,
+            'review_cache_stats': actions.review_cache_stats,
         }
     
     # IAuthFunctions
@@ -56,9 +85,29 @@ class OnboardingTheodoroBertolPlugin(
         return {
             'user_reviewer_grant': auth.user_reviewer_grant,
             'user_reviewer_revoke': auth.user_reviewer_revoke,
+            'user_reviewer_grant_many': auth.user_reviewer_grant_many,
+            'user_reviewer_revoke_many': auth.user_reviewer_revoke_many,
             'dataset_review': auth.dataset_review,
+            'dataset_review_bulk': auth.dataset_review_bulk,
+            'dataset_review_claim': auth.dataset_review_claim,
+            'dataset_review_release': auth.dataset_review_release,
+            'dataset_review_queue': auth.dataset_review_queue,
+            'dataset_review_history': auth.dataset_review_history,
+            'review_stats': auth.review_stats,
+            'review_export': auth.review_export,
+            'dataset_review_assignments': auth.dataset_review_assignments,
+            'review_cache_stats': auth.review_cache_stats,
+            'package_create_many': auth.package_create_many,
         }
     
+    # IClick
+    def get_commands(self):
+        return cli.get_commands()
+
+    # IPackageController
+    def before_dataset_index(self, pkg_dict):
+        return index_review_fields(pkg_dict)
+
     # IDatasetForm
     def is_fallback(self):
         return True
@@ -87,6 +136,10 @@ class OnboardingTheodoroBertolPlugin(
             'resubmitted_after_rejection': [
                 toolkit.get_validator('ignore_missing'),
                 toolkit.get_converter('convert_to_extras'),
+            ],
+            'review_submitted': [
+                toolkit.get_validator('ignore_missing'),
+                toolkit.get_converter('convert_to_extras'),
             ]
         })
         return schema
@@ -108,7 +161,8 @@ class OnboardingTheodoroBertolPlugin(
             'reviewer_id': [toolkit.get_converter('convert_from_extras')],
             'review_date': [toolkit.get_converter('convert_from_extras')],
             'last_reviewer_id': [toolkit.get_converter('convert_from_extras')],
-            'resubmitted_after_rejection': [toolkit.get_converter('convert_from_extras')]
+            'resubmitted_after_rejection': [toolkit.get_converter('convert_from_extras')],
+            'review_submitted': [toolkit.get_converter('convert_from_extras')]
         })
         return schema
 
@@ -0,0 +1,99 @@
+"""Benchmark of package_create_many against one package_create per dataset
+
+Skipped by default, run with:
+
+    ONBOARDING_BENCHMARK=1 pytest --ckan-ini=test.ini -s \
+        ckanext/onboarding_theodoro_bertol/tests/benchmarks
+"""
+import contextlib
+import math
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+from ckan.lib.search.index import PackageSearchIndex
+import ckan.tests.factories as factories
+import ckan.tests.helpers as helpers
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('ONBOARDING_BENCHMARK'),
+    reason='Set ONBOARDING_BENCHMARK=1 to run benchmarks'
+)
+
+DATASETS = int(os.environ.get('ONBOARDING_BENCHMARK_DATASETS', 500))
+BATCH_SIZE = 100
+
+
+def _datasets(prefix, org):
+    return [
+        {
+            'name': '{}-{}'.format(prefix, i),
+            'owner_org': org['id'],
+            'private': bool(i % 2),
+            'resources': [{'url': 'http://example.com/{}.csv'.format(i)}],
+        }
+        for i in range(DATASETS)
+    ]
+
+
+@contextlib.contextmanager
+def _solr_commits():
+    """Count the Solr commits sent: explicit ones and the ones of datasets
+    indexed without ``defer_commit``"""
+    commits = []
+    index_package = PackageSearchIndex.index_package
+    commit = PackageSearchIndex.commit
+
+    def counting_index_package(self, pkg_dict, defer_commit=False):
+        if not defer_commit:
+            commits.append(pkg_dict['id'])
+        return index_package(self, pkg_dict, defer_commit=defer_commit)
+
+    def counting_commit(self):
+        commits.append(None)
+        return commit(self)
+
+    with patch.object(PackageSearchIndex, 'index_package', counting_index_package), \
+            patch.object(PackageSearchIndex, 'commit', counting_commit):
+        yield commits
+
+
+class TestBulkCreate:
+    """Compare bulk ingest mode with the per-dataset path"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    def test_bulk_create_throughput(self):
+        sysadmin = factories.Sysadmin()
+        org = factories.Organization()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        with _solr_commits() as single_commits:
+            start = time.perf_counter()
+            for dataset in _datasets('bench-single', org):
+                helpers.call_action('package_create', context=dict(context), **dataset)
+            single = time.perf_counter() - start
+
+        with _solr_commits() as bulk_commits:
+            start = time.perf_counter()
+            result = helpers.call_action(
+                'package_create_many', context=dict(context),
+                datasets=_datasets('bench-bulk', org), batch_size=BATCH_SIZE
+            )
+            bulk = time.perf_counter() - start
+
+        assert not result['errors']
+        print('\n{} datasets'.format(DATASETS))
+        print('  package_create:      {:.2f}s ({:.0f} datasets/s), {} Solr commits'.format(
+            single, DATASETS / single, len(single_commits)))
+        print('  package_create_many: {:.2f}s ({:.0f} datasets/s), {} Solr commits'.format(
+            bulk, DATASETS / bulk, len(bulk_commits)))
+
+        # Wall-clock time is too noisy to assert on, the number of Solr
+        # commits is what bulk ingest mode saves
+        assert len(single_commits) >= DATASETS
+        assert len(bulk_commits) == math.ceil(DATASETS / BATCH_SIZE)
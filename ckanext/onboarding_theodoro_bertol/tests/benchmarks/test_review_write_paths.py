@@ -0,0 +1,78 @@
+"""Benchmark of the dataset_review write path against a full package_patch
+
+Skipped by default, run with:
+
+    ONBOARDING_BENCHMARK=1 pytest --ckan-ini=test.ini -s \
+        ckanext/onboarding_theodoro_bertol/tests/benchmarks
+"""
+import os
+import time
+
+import pytest
+import ckan.tests.factories as factories
+import ckan.tests.helpers as helpers
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('ONBOARDING_BENCHMARK'),
+    reason='Set ONBOARDING_BENCHMARK=1 to run benchmarks'
+)
+
+RESOURCES = int(os.environ.get('ONBOARDING_BENCHMARK_RESOURCES', 200))
+ROUNDS = int(os.environ.get('ONBOARDING_BENCHMARK_ROUNDS', 5))
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+class TestReviewWritePaths:
+    """Compare dataset_review with the show+patch path it replaced"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    def _large_dataset(self, user, name):
+        return helpers.call_action(
+            'package_create',
+            context={'user': user['name'], 'ignore_auth': True},
+            name=name,
+            private=True,
+            resources=[
+                {'url': 'http://example.com/{}.csv'.format(i), 'name': 'res-{}'.format(i)}
+                for i in range(RESOURCES)
+            ],
+            extras=[{'key': 'extra-{}'.format(i), 'value': str(i)} for i in range(50)],
+        )
+
+    def test_review_write_paths(self):
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        legacy = self._large_dataset(sysadmin, 'bench-legacy')
+        fast = self._large_dataset(sysadmin, 'bench-fast')
+
+        def legacy_path():
+            helpers.call_action('package_show', context=dict(context), id=legacy['id'])
+            helpers.call_action(
+                'package_patch', context=dict(context), id=legacy['id'],
+                review_status='rejected', reviewer_id=sysadmin['id'],
+                review_date='2026-10-18T00:00:00', resubmitted_after_rejection=False
+            )
+
+        def fast_path():
+            helpers.call_action(
+                'dataset_review', context=dict(context), id=fast['id'],
+                review_status='rejected'
+            )
+
+        legacy_times = [_timed(legacy_path) for i in range(ROUNDS)]
+        fast_times = [_timed(fast_path) for i in range(ROUNDS)]
+
+        print('\n{} resources, best of {} rounds'.format(RESOURCES, ROUNDS))
+        print('  show + package_patch: {:.3f}s'.format(min(legacy_times)))
+        print('  dataset_review:       {:.3f}s'.format(min(fast_times)))
+
+        assert min(fast_times) < min(legacy_times)
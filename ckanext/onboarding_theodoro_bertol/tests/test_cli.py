@@ -0,0 +1,36 @@
+"""Tests for the onboarding_theodoro_bertol commands"""
+import datetime
+import pytest
+import ckan.tests.factories as factories
+import ckan.tests.helpers as helpers
+from ckan.cli.cli import ckan
+
+
+class TestReindexCommand:
+    """Test the reindex command"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    @pytest.mark.parametrize('workers', ['1', '2'])
+    def test_reindex_changed_datasets(self, cli, workers):
+        """Test that both the single and multi-worker paths reindex in a request context"""
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        since = datetime.datetime.utcnow()
+        datasets = [
+            helpers.call_action(
+                'package_create', context=dict(context),
+                name='test-dataset-cli-reindex-{}'.format(i), private=False
+            )
+            for i in range(3)
+        ]
+
+        result = cli.invoke(ckan, [
+            'onboarding_theodoro_bertol', 'reindex', '--batch-size', '2',
+            '--workers', workers, '--since', since.strftime('%Y-%m-%dT%H:%M:%S'),
+        ])
+        assert not result.exit_code, result.output
+        assert 'Reindexed {} datasets'.format(len(datasets)) in result.output
@@ -3,7 +3,12 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 import ckan.tests.factories as factories
 import ckan.tests.helpers as helpers
-from ckanext.onboarding_theodoro_bertol.lib.helpers import user_is_reviewer, get_current_user_info
+from ckanext.onboarding_theodoro_bertol.lib.helpers import (
+    user_is_reviewer, get_current_user_info, get_user_display_names,
+    pending_review_count
+)
+from ckanext.onboarding_theodoro_bertol.lib.cache import TTLCache, cache_stats, clear_caches
+from ckanext.onboarding_theodoro_bertol.lib.fragment_cache import cached_fragment, reset_backend
 
 
 class TestHelpers:
@@ -13,6 +18,7 @@ class TestHelpers:
     def setup(self):
         """Setup test fixtures"""
         helpers.reset_db()
+        clear_caches()
         
     def test_user_is_reviewer_with_sysadmin(self):
         """Test that sysadmins are considered reviewers"""
@@ -89,4 +95,259 @@ class TestHelpers:
         assert 'message' in info
         assert info['message'] == 'This comes from a helper function!'
         assert 'timestamp' in info
-        assert info['timestamp'] == 'Generated at page load'
\ No newline at end of file
+        assert info['timestamp'] == 'Generated at page load'
+
+    def test_user_is_reviewer_is_cached(self):
+        """Test that repeated lookups are served from the reviewer cache"""
+        user = factories.User()
+
+        assert user_is_reviewer(user['id']) is False
+        assert user_is_reviewer(user['id']) is False
+
+        stats = cache_stats()['reviewer']
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+
+    def test_user_is_reviewer_cache_invalidated_on_grant(self):
+        """Test that granting permission invalidates cached id and name lookups"""
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        assert user_is_reviewer(user['id']) is False
+        assert user_is_reviewer(user['name']) is False
+
+        helpers.call_action(
+            'user_reviewer_grant',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=user['name']
+        )
+
+        assert user_is_reviewer(user['id']) is True
+        assert user_is_reviewer(user['name']) is True
+
+    def test_user_is_reviewer_cache_invalidated_on_delete(self):
+        """Test that deleting a reviewer invalidates the cached status"""
+        sysadmin = factories.Sysadmin()
+
+        assert user_is_reviewer(sysadmin['id']) is True
+
+        helpers.call_action(
+            'user_delete',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=sysadmin['id']
+        )
+
+        assert user_is_reviewer(sysadmin['id']) is False
+
+    def test_get_user_display_names(self):
+        """Test resolving several users to display names at once"""
+        user1 = factories.User(fullname='Jane Reviewer')
+        user2 = factories.User(fullname='')
+
+        names = get_user_display_names([user1['id'], user2['name'], None, 'nobody'])
+
+        assert names[user1['id']] == 'Jane Reviewer'
+        assert names[user2['name']] == user2['name']
+        assert 'nobody' not in names
+        assert get_user_display_names([]) == {}
+
+    def test_pending_review_count_is_cached_and_follows_transitions(self):
+        """Test the header badge counter"""
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        assert pending_review_count() == 0
+        dataset = helpers.call_action(
+            'package_create',
+            context={'user': user['name'], 'ignore_auth': True},
+            name='test-dataset-badge',
+            private=False
+        )
+        assert pending_review_count() == 1
+        assert pending_review_count() == 1
+        assert cache_stats()['pending_count']['hits'] >= 1
+
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='approved'
+        )
+        assert pending_review_count() == 0
+
+    def test_pending_review_count_dropped_once_committed(self):
+        """Test that a count cached before the change is committed is not kept"""
+        import ckan.model as model
+        from ckanext.onboarding_theodoro_bertol.lib import stats
+
+        assert pending_review_count() == 0
+        stats.count_changes([(None, None, None, 'pending')])
+        # What a concurrent request still sees until the commit
+        stats._pending_cache().set('pending', 0)
+        model.repo.commit()
+        assert pending_review_count() == 1
+
+
+class TestTTLCache:
+    """Test the process-level cache"""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.get('b', None) is None
+
+    def test_expiry(self):
+        """Test that expired entries count as misses"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', False)
+
+        with patch('ckanext.onboarding_theodoro_bertol.lib.cache.time.monotonic',
+                   return_value=float('inf')):
+            assert cache.get('a', None) is None
+
+        assert cache.stats()['misses'] == 1
+        assert cache.stats()['size'] == 0
+
+
+class FakeRedis(object):
+    """The subset of the redis client used by the fragment cache"""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.ttls = {}
+        self.fail = fail
+
+    def _key(self, key):
+        return key.encode('utf-8') if isinstance(key, str) else key
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError('Redis is down')
+        return self.data.get(self._key(key))
+
+    def setex(self, key, ttl, value):
+        if self.fail:
+            raise ConnectionError('Redis is down')
+        self.data[self._key(key)] = value.encode('utf-8')
+        self.ttls[self._key(key)] = ttl
+
+    def scan_iter(self, pattern):
+        prefix = self._key(pattern.rstrip('*'))
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def delete(self, key):
+        self.data.pop(self._key(key), None)
+        self.ttls.pop(self._key(key), None)
+
+
+class TestFragmentCache:
+    """Test the fragment cache used for the dataset review block"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Start every test with a fresh backend"""
+        clear_caches()
+        reset_backend()
+        yield
+        reset_backend()
+
+    def test_memory_backend_renders_once_per_key(self):
+        """Test that a fragment is only rendered again when its key changes"""
+        render = Mock(return_value='<div>block</div>')
+
+        assert cached_fragment('review_block:1:t1', render) == '<div>block</div>'
+        assert cached_fragment('review_block:1:t1', render) == '<div>block</div>'
+        assert render.call_count == 1
+
+        cached_fragment('review_block:1:t2', render)
+        assert render.call_count == 2
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.backend', 'none')
+    def test_none_backend_always_renders(self):
+        """Test that caching can be disabled"""
+        render = Mock(return_value='<div>block</div>')
+
+        cached_fragment('review_block:1:t1', render)
+        cached_fragment('review_block:1:t1', render)
+        assert render.call_count == 2
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.size', '1')
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.cache.fragment.size', '100')
+    def test_memory_backend_has_one_size_option(self):
+        """Test that only fragment_cache.size sizes the memory backend"""
+        render = Mock(return_value='<div>block</div>')
+
+        cached_fragment('review_block:1:t1', render)
+        cached_fragment('review_block:2:t1', render)
+        cached_fragment('review_block:1:t1', render)
+        assert render.call_count == 3
+        assert cache_stats()['fragment']['maxsize'] == 1
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.backend', 'redis')
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.ttl', '120')
+    def test_redis_backend(self):
+        """Test the Redis backend against a fake client"""
+        from ckanext.onboarding_theodoro_bertol.lib.fragment_cache import RedisBackend, get_backend
+        redis = FakeRedis()
+        redis.data[b'other-site:onboarding_fragment:kept'] = b'x'
+        with patch('ckan.lib.redis.connect_to_redis', return_value=redis):
+            backend = get_backend()
+        assert isinstance(backend, RedisBackend)
+        render = Mock(return_value='<div>block</div>')
+
+        assert cached_fragment('review_block:1:t1', render) == '<div>block</div>'
+        assert cached_fragment('review_block:1:t1', render) == '<div>block</div>'
+        assert render.call_count == 1
+        key = [k for k in redis.data if k.endswith(b':onboarding_fragment:review_block:1:t1')]
+        assert len(key) == 1
+        assert redis.ttls[key[0]] == 120
+
+        backend.clear()
+        assert list(redis.data) == [b'other-site:onboarding_fragment:kept']
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.backend', 'redis')
+    def test_redis_backend_failures_render(self):
+        """Test that an unavailable Redis degrades to rendering every time"""
+        from ckanext.onboarding_theodoro_bertol.lib.fragment_cache import get_backend
+        redis = FakeRedis(fail=True)
+        with patch('ckan.lib.redis.connect_to_redis', return_value=redis):
+            get_backend()
+        render = Mock(return_value='<div>block</div>')
+
+        cached_fragment('review_block:1:t1', render)
+        cached_fragment('review_block:1:t1', render)
+        assert render.call_count == 2
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.backend', 'redis')
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.fragment_cache.ttl', '0')
+    def test_redis_backend_without_ttl_does_not_store(self):
+        """Test that a zero TTL disables writes to Redis"""
+        from ckanext.onboarding_theodoro_bertol.lib.fragment_cache import get_backend
+        redis = FakeRedis()
+        with patch('ckan.lib.redis.connect_to_redis', return_value=redis):
+            get_backend()
+
+        cached_fragment('review_block:1:t1', Mock(return_value='<div>block</div>'))
+        assert redis.data == {}
+
+    def test_review_block_substitutes_csrf_per_request(self, app):
+        """Test that the cached review block never holds a CSRF token"""
+        from ckanext.onboarding_theodoro_bertol.lib.helpers import review_block, CSRF_PLACEHOLDER
+        dataset = factories.Dataset()
+
+        with app.flask_app.test_request_context():
+            with patch('ckan.plugins.toolkit.render_snippet',
+                       return_value='<form>{}</form>'.format(CSRF_PLACEHOLDER)) as render:
+                first = review_block(dataset)
+                second = review_block(dataset)
+
+        assert render.call_count == 1
+        assert CSRF_PLACEHOLDER not in first
+        assert first == second
@@ -0,0 +1,213 @@
+"""Tests for the resubmission notification jobs"""
+import datetime
+import email
+import socket
+import pytest
+from unittest.mock import Mock, patch
+import ckan.model as model
+import ckan.tests.factories as factories
+import ckan.tests.helpers as helpers
+from ckan.plugins import toolkit as tk
+from ckanext.onboarding_theodoro_bertol.lib import notifications
+from ckanext.onboarding_theodoro_bertol.model import NotificationFailure, PendingNotification
+
+
+class TestResubmissionNotifications:
+    """Test queueing and delivery of resubmission notifications"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.backend', 'inline')
+    @patch('ckan.lib.mailer.mail_recipient')
+    def test_inline_backend_sends_mail(self, mail_recipient):
+        """Test that the in-process backend delivers the e-mail"""
+        reviewer = factories.User(email='reviewer@example.com')
+        dataset = factories.Dataset()
+
+        notifications.enqueue_resubmission_notification(reviewer['id'], dataset)
+
+        assert mail_recipient.call_count == 1
+        assert mail_recipient.call_args[0][1] == 'reviewer@example.com'
+        assert model.Session.query(NotificationFailure).count() == 0
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.backend', 'inline')
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.max_retries', '2')
+    @patch('ckan.lib.mailer.mail_recipient', side_effect=Exception('SMTP down'))
+    def test_inline_backend_dead_letters_after_retries(self, mail_recipient):
+        """Test that a notification failing on every attempt is dead-lettered"""
+        reviewer = factories.User(email='reviewer@example.com')
+        dataset = factories.Dataset()
+
+        notifications.enqueue_resubmission_notification(reviewer['id'], dataset)
+
+        assert mail_recipient.call_count == 3
+        failure = model.Session.query(NotificationFailure).one()
+        assert failure.recipient_id == reviewer['id']
+        assert failure.package_id == dataset['id']
+        assert failure.attempts == 3
+        assert 'SMTP down' in failure.error
+
+    def test_rq_backend_enqueues_job_with_retry(self):
+        """Test that the default backend queues a background job"""
+        dataset = factories.Dataset()
+
+        with patch.object(tk, 'enqueue_job') as enqueue_job:
+            notifications.enqueue_resubmission_notification('some-reviewer', dataset)
+
+        assert enqueue_job.call_count == 1
+        args, kwargs = enqueue_job.call_args
+        assert args[0] is notifications.send_resubmission_notification
+        assert kwargs['kwargs']['dataset_id'] == dataset['id']
+        assert kwargs['rq_kwargs']['retry'].max == 3
+        # Retried straight away, `ckan jobs worker` runs no scheduler
+        assert kwargs['rq_kwargs']['retry'].intervals == [0]
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.retry_intervals', '60 300')
+    def test_rq_backend_retry_intervals(self):
+        """Test that configured intervals are passed on to RQ"""
+        dataset = factories.Dataset()
+
+        with patch.object(tk, 'enqueue_job') as enqueue_job:
+            notifications.enqueue_resubmission_notification('some-reviewer', dataset)
+
+        assert enqueue_job.call_args[1]['rq_kwargs']['retry'].intervals == [60, 300]
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.max_retries', '2')
+    @patch('ckan.lib.mailer.mail_recipient', side_effect=Exception('SMTP down'))
+    def test_worker_retries_then_dead_letters(self, mail_recipient):
+        """Test that a plain worker runs the retries and the last one is dead-lettered"""
+        from ckan.lib import jobs
+        reviewer = factories.User(email='reviewer@example.com')
+        dataset = factories.Dataset()
+        jobs.get_queue().empty()
+
+        notifications.enqueue_resubmission_notification(reviewer['id'], dataset)
+        # Jobs run in a forked work horse: the dead letter is only written
+        # once the job has no retries left, i.e. after both retries ran
+        jobs.Worker(['default']).work(burst=True)
+
+        failure = model.Session.query(NotificationFailure).one()
+        assert failure.recipient_id == reviewer['id']
+        assert failure.attempts == 3
+        assert 'SMTP down' in failure.error
+        assert jobs.get_queue().count == 0
+
+    @patch('ckan.lib.mailer.mail_recipient', side_effect=Exception('SMTP down'))
+    def test_job_only_dead_letters_on_last_attempt(self, mail_recipient):
+        """Test that the job re-raises for RQ and dead-letters on its last try"""
+        reviewer = factories.User(email='reviewer@example.com')
+        dataset = factories.Dataset()
+
+        with patch('rq.get_current_job', return_value=Mock(retries_left=1)):
+            with pytest.raises(Exception):
+                notifications.send_resubmission_notification(reviewer['id'], dataset['id'])
+        assert model.Session.query(NotificationFailure).count() == 0
+
+        with patch('rq.get_current_job', return_value=Mock(retries_left=0)):
+            with pytest.raises(Exception):
+                notifications.send_resubmission_notification(reviewer['id'], dataset['id'])
+        assert model.Session.query(NotificationFailure).count() == 1
+
+
+class TestNotificationDigests:
+    """Test digest mode"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.digest_window', '3600')
+    @patch('ckanext.onboarding_theodoro_bertol.lib.notifications.smtplib.SMTP')
+    def test_digests_share_one_smtp_session(self, smtp):
+        """Test one message per reviewer, all over a single connection"""
+        reviewer1 = factories.User(email='reviewer1@example.com')
+        reviewer2 = factories.User(email='reviewer2@example.com')
+        datasets = [factories.Dataset() for i in range(3)]
+
+        notifications.enqueue_resubmission_notification(reviewer1['id'], datasets[0])
+        notifications.enqueue_resubmission_notification(reviewer1['id'], datasets[1])
+        notifications.enqueue_resubmission_notification(reviewer2['id'], datasets[2])
+        assert model.Session.query(PendingNotification).count() == 3
+
+        # Nothing is due before the window has elapsed
+        assert notifications.send_digests() == 0
+        assert smtp.call_count == 0
+
+        later = datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+        assert notifications.send_digests(now=later) == 2
+
+        assert smtp.call_count == 1
+        connection = smtp.return_value
+        assert connection.sendmail.call_count == 2
+        assert connection.quit.call_count == 1
+        recipients = sorted(c[0][1][0] for c in connection.sendmail.call_args_list)
+        assert recipients == ['reviewer1@example.com', 'reviewer2@example.com']
+        assert model.Session.query(PendingNotification).count() == 0
+
+    @pytest.fixture
+    def smtp_sink(self, ckan_config, monkeypatch):
+        """A local debugging SMTP server collecting the envelopes it receives"""
+        from aiosmtpd.controller import Controller
+
+        class Sink:
+            def __init__(self):
+                self.envelopes = []
+
+            async def handle_DATA(self, server, session, envelope):
+                self.envelopes.append(envelope)
+                return '250 Message accepted for delivery'
+
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        sink = Sink()
+        controller = Controller(sink, hostname='127.0.0.1', port=port)
+        controller.start()
+        monkeypatch.setitem(ckan_config, 'smtp.test_server', '127.0.0.1:{}'.format(port))
+        yield sink
+        controller.stop()
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.notifications.digest_window', '3600')
+    @pytest.mark.ckan_config('smtp.mail_from', 'ckan@example.com')
+    def test_digests_received_by_smtp_server(self, smtp_sink):
+        """Test the digests actually received by a local SMTP server"""
+        reviewer1 = factories.User(email='reviewer1@example.com')
+        reviewer2 = factories.User(email='reviewer2@example.com')
+        datasets = [factories.Dataset(title='Dataset {}'.format(i)) for i in range(3)]
+
+        notifications.enqueue_resubmission_notification(reviewer1['id'], datasets[0])
+        notifications.enqueue_resubmission_notification(reviewer1['id'], datasets[1])
+        notifications.enqueue_resubmission_notification(reviewer2['id'], datasets[2])
+
+        later = datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+        assert notifications.send_digests(now=later) == 2
+
+        received = dict(
+            (envelope.rcpt_tos[0], envelope) for envelope in smtp_sink.envelopes
+        )
+        assert len(smtp_sink.envelopes) == 2
+        assert sorted(received) == ['reviewer1@example.com', 'reviewer2@example.com']
+        for envelope in smtp_sink.envelopes:
+            assert envelope.mail_from == 'ckan@example.com'
+            assert len(envelope.rcpt_tos) == 1
+
+        expected = {
+            'reviewer1@example.com': (datasets[0], datasets[1]),
+            'reviewer2@example.com': (datasets[2],),
+        }
+        for address, envelope in received.items():
+            message = email.message_from_bytes(envelope.original_content)
+            assert message['Subject'] == '{} datasets resubmitted for review'.format(
+                len(expected[address]))
+            body = message.get_payload(decode=True).decode('utf-8')
+            for dataset in expected[address]:
+                assert dataset['title'] in body
+                assert tk.url_for('dataset.read', id=dataset['id'], _external=True) in body
+            others = [d for d in datasets if d not in expected[address]]
+            for dataset in others:
+                assert dataset['id'] not in body
+        assert model.Session.query(PendingNotification).count() == 0
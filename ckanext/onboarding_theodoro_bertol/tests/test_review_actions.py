@@ -1,10 +1,13 @@
 """Tests for dataset review actions"""
+import datetime
+import os
 import pytest
 from unittest.mock import Mock, patch
 import ckan.tests.factories as factories
 import ckan.tests.helpers as helpers
 from ckan.common import config
 import ckan.logic as logic
+import ckan.model as model
 
 
 class TestDatasetReviewActions:
@@ -142,4 +145,833 @@ class TestDatasetReviewActions:
         assert result.get('success') is True
         
         # Check user is no longer a reviewer
-        assert user_is_reviewer(user['id']) is False
\ No newline at end of file
+        assert user_is_reviewer(user['id']) is False
+
+    def test_reviewer_roster_follows_grant_revoke(self):
+        """Test that the reviewer table is kept in sync by grant and revoke"""
+        from ckanext.onboarding_theodoro_bertol.model import Reviewer
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        helpers.call_action(
+            'user_reviewer_grant',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=user['name']
+        )
+        roster = [u.name for u in Reviewer.roster()]
+        assert user['name'] in roster
+        assert sysadmin['name'] in roster
+
+        helpers.call_action(
+            'user_reviewer_revoke',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=user['name']
+        )
+        roster = [u.name for u in Reviewer.roster()]
+        assert user['name'] not in roster
+        assert sysadmin['name'] in roster
+
+    def test_reviewer_grant_revoke_many(self):
+        """Test granting and revoking reviewer permissions in bulk"""
+        from ckanext.onboarding_theodoro_bertol.lib.helpers import user_is_reviewer
+        sysadmin = factories.Sysadmin()
+        user1 = factories.User()
+        user2 = factories.User()
+
+        result = helpers.call_action(
+            'user_reviewer_grant_many',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            usernames=[user1['name'], user2['id'], 'no-such-user']
+        )
+
+        assert result['not_found'] == ['no-such-user']
+        assert [r['success'] for r in result['results']] == [True, True, False]
+        assert user_is_reviewer(user1['id']) is True
+        assert user_is_reviewer(user2['id']) is True
+
+        result = helpers.call_action(
+            'user_reviewer_revoke_many',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            usernames=[user1['name'], user2['name']]
+        )
+
+        assert result['not_found'] == []
+        assert user_is_reviewer(user1['id']) is False
+        assert user_is_reviewer(user2['id']) is False
+
+    def test_dataset_review_bulk(self):
+        """Test approving several datasets in one call"""
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        datasets = [
+            helpers.call_action(
+                'package_create',
+                context={'user': user['name'], 'ignore_auth': True},
+                name='test-dataset-bulk-{}'.format(i),
+                title='Test Dataset Bulk {}'.format(i),
+                private=True
+            )
+            for i in range(2)
+        ]
+
+        result = helpers.call_action(
+            'dataset_review_bulk',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            ids=[d['id'] for d in datasets] + ['no-such-dataset'],
+            review_status='approved'
+        )
+
+        assert sorted(result['datasets']) == sorted(d['id'] for d in datasets)
+        assert result['not_found'] == ['no-such-dataset']
+
+        for dataset in datasets:
+            dataset = helpers.call_action('package_show', id=dataset['id'])
+            assert dataset['review_status'] == 'approved'
+            assert dataset['reviewer_id'] == sysadmin['id']
+            assert dataset['private'] is False
+
+        search = helpers.call_action(
+            'package_search', fq='review_status:approved', include_private=True
+        )
+        assert search['count'] == 2
+
+    def test_non_reviewer_cannot_review_bulk(self):
+        """Test that non-reviewers cannot bulk review datasets"""
+        user = factories.User()
+        dataset = factories.Dataset(private=True)
+
+        with pytest.raises(logic.NotAuthorized):
+            helpers.call_action(
+                'dataset_review_bulk',
+                context={'user': user['name'], 'ignore_auth': False},
+                ids=[dataset['id']],
+                review_status='approved'
+            )
+
+    def test_get_review_state(self):
+        """Test the lightweight review state accessor"""
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import get_review_state
+        user = factories.User()
+
+        dataset = helpers.call_action(
+            'package_create',
+            context={'user': user['name'], 'ignore_auth': True},
+            name='test-dataset-state',
+            title='Test Dataset State',
+            private=False
+        )
+
+        by_id = get_review_state(dataset['id'])
+        by_name = get_review_state(dataset['name'])
+        assert by_id == by_name
+        assert by_id['private'] is True
+        assert by_id['review_status'] == 'pending'
+        assert by_id['reviewer_id'] is None
+        assert get_review_state('no-such-dataset') is None
+
+    def test_package_update_to_public_sets_pending(self):
+        """Test that making a private dataset public puts it in review"""
+        user = factories.User()
+
+        dataset = helpers.call_action(
+            'package_create',
+            context={'user': user['name'], 'ignore_auth': True},
+            name='test-dataset-update',
+            title='Test Dataset Update',
+            private=True
+        )
+        dataset['private'] = False
+
+        result = helpers.call_action(
+            'package_update',
+            context={'user': user['name'], 'ignore_auth': True},
+            **dataset
+        )
+
+        assert result['private'] is True
+        assert result['review_status'] == 'pending'
+
+    def test_dataset_review_queue_pagination(self):
+        """Test walking the review queue with the keyset cursor"""
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        datasets = [
+            helpers.call_action(
+                'package_create',
+                context={'user': user['name'], 'ignore_auth': True},
+                name='test-dataset-queue-{}'.format(i),
+                private=False
+            )
+            for i in range(5)
+        ]
+        helpers.call_action(
+            'dataset_review_bulk',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            ids=[d['id'] for d in datasets],
+            review_status='approved'
+        )
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            params = {'review_status': 'approved', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            page = helpers.call_action(
+                'dataset_review_queue',
+                context={'user': sysadmin['name'], 'ignore_auth': True},
+                **params
+            )
+            assert page['count'] == 5
+            assert page['facets'].get('approved') == 5
+            seen.extend(d['id'] for d in page['results'])
+            pages += 1
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert len(seen) == len(set(seen)) == 5
+
+    @pytest.mark.parametrize('cursor', [
+        'not-a-cursor',
+        12,
+        ['2026-10-18T00:00:00', 'some-id'],
+        # A valid timestamp but no string id
+        'WyIyMDI2LTEwLTE4VDAwOjAwOjAwIiwgMV0=',
+    ])
+    def test_dataset_review_queue_invalid_cursor(self, cursor):
+        """Test that a malformed cursor is rejected"""
+        sysadmin = factories.Sysadmin()
+
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action(
+                'dataset_review_queue',
+                context={'user': sysadmin['name'], 'ignore_auth': True},
+                cursor=cursor
+            )
+
+    def test_dataset_review_queue_cursor_id_is_escaped(self):
+        """Test that the id of a cursor cannot change the search query"""
+        from ckanext.onboarding_theodoro_bertol.logic.action import _encode_cursor
+        sysadmin = factories.Sysadmin()
+        dataset = factories.Dataset(private=False)
+
+        page = helpers.call_action(
+            'dataset_review_queue',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            cursor=_encode_cursor(dataset['metadata_modified'], '0") OR (*:*')
+        )
+        assert page['results'] == []
+
+    def test_dataset_review_queue_date_ranges(self):
+        """Test filtering the queue on review date and pending age"""
+        sysadmin = factories.Sysadmin()
+        dataset = factories.Dataset(private=False)
+
+        reviewed = helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='approved'
+        )
+        review_date = datetime.datetime.fromisoformat(reviewed['review_date'])
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        inside = helpers.call_action(
+            'dataset_review_queue', context=dict(context),
+            reviewed_after=(review_date - datetime.timedelta(hours=1)).isoformat(),
+            reviewed_before=(review_date + datetime.timedelta(hours=1)).isoformat()
+        )
+        assert [d['id'] for d in inside['results']] == [dataset['id']]
+
+        outside = helpers.call_action(
+            'dataset_review_queue', context=dict(context),
+            reviewed_before=(review_date - datetime.timedelta(hours=1)).isoformat()
+        )
+        assert outside['count'] == 0
+
+        stale = helpers.call_action(
+            'dataset_review_queue', context=dict(context), pending_for_hours=0
+        )
+        assert dataset['id'] not in [d['id'] for d in stale['results']]
+
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action(
+                'dataset_review_queue', context=dict(context),
+                reviewed_after='not a date'
+            )
+
+    def test_pending_for_hours_uses_submission_time(self):
+        """Test that edits of a pending dataset do not reset its age"""
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import write_review_fields
+        import ckan.lib.search as search
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        stale = factories.Dataset(private=False)
+        fresh = factories.Dataset(private=False)
+
+        # Submitted two days ago, edited just now
+        write_review_fields(
+            [stale['id']],
+            {'review_submitted': datetime.datetime.utcnow() - datetime.timedelta(days=2)}
+        )
+        model.repo.commit()
+        search.rebuild(stale['id'])
+        helpers.call_action('package_patch', context=dict(context), id=stale['id'], notes='Edited')
+
+        result = helpers.call_action(
+            'dataset_review_queue', context=dict(context), pending_for_hours=24
+        )
+        assert [d['id'] for d in result['results']] == [stale['id']]
+        assert fresh['id'] not in [d['id'] for d in result['results']]
+
+    def test_dataset_review_queue_respects_permission_labels(self):
+        """Test that private datasets are only listed for users who can see them"""
+        sysadmin = factories.Sysadmin()
+        reviewer = factories.User()
+        member = factories.User()
+        org = factories.Organization(users=[{'name': member['name'], 'capacity': 'editor'}])
+        other_org = factories.Organization()
+
+        for i, owner_org in enumerate([org, org, other_org]):
+            helpers.call_action(
+                'package_create',
+                context={'user': sysadmin['name'], 'ignore_auth': True},
+                name='test-dataset-labels-{}'.format(i),
+                owner_org=owner_org['id'],
+                private=False
+            )
+        helpers.call_action(
+            'user_reviewer_grant_many',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            usernames=[reviewer['name'], member['name']]
+        )
+
+        def queue(user):
+            return helpers.call_action(
+                'dataset_review_queue',
+                context={'user': user['name'], 'ignore_auth': False},
+                review_status='pending'
+            )
+
+        assert queue(sysadmin)['count'] == 3
+        assert queue(member)['count'] == 2
+        assert len(queue(member)['results']) == 2
+        assert queue(reviewer)['count'] == 0
+
+    def test_dataset_review_history(self):
+        """Test that submissions and reviews are appended to the history"""
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+
+        dataset = helpers.call_action(
+            'package_create',
+            context={'user': user['name'], 'ignore_auth': True},
+            name='test-dataset-history',
+            private=False
+        )
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='rejected'
+        )
+        helpers.call_action(
+            'package_update',
+            context={'user': user['name'], 'ignore_auth': True},
+            **dict(dataset, title='Fixed title', private=True)
+        )
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='approved'
+        )
+
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        history = helpers.call_action(
+            'dataset_review_history', context=dict(context), id=dataset['name']
+        )
+        assert [e['review_status'] for e in history['results']] == [
+            'approved', 'pending', 'rejected', 'pending'
+        ]
+        assert [e['resubmitted'] for e in history['results']] == [
+            True, True, False, False
+        ]
+        assert history['next_cursor'] is None
+
+        first = helpers.call_action(
+            'dataset_review_history', context=dict(context),
+            user_id=sysadmin['name'], limit=1
+        )
+        assert first['results'][0]['review_status'] == 'approved'
+        second = helpers.call_action(
+            'dataset_review_history', context=dict(context),
+            user_id=sysadmin['name'], limit=1, cursor=first['next_cursor']
+        )
+        assert second['results'][0]['review_status'] == 'rejected'
+        assert second['next_cursor'] is None
+
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action('dataset_review_history', context=dict(context))
+
+    def test_review_history_hides_private_datasets(self):
+        """Test that reviewers only see the history of datasets they can read"""
+        sysadmin = factories.Sysadmin()
+        reviewer = factories.User()
+        submitter = factories.User()
+        org = factories.Organization(users=[{'name': submitter['name'], 'capacity': 'editor'}])
+        helpers.call_action(
+            'user_reviewer_grant', context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=reviewer['name']
+        )
+        datasets = [
+            helpers.call_action(
+                'package_create', context={'user': submitter['name']},
+                name='test-dataset-history-labels-{}'.format(i),
+                owner_org=org['id'], private=False
+            )
+            for i in range(2)
+        ]
+        # The first one is approved (public), the second stays pending (private)
+        helpers.call_action(
+            'dataset_review', context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=datasets[0]['id'], review_status='approved'
+        )
+        context = {'user': reviewer['name']}
+
+        with pytest.raises(logic.NotAuthorized):
+            helpers.call_action('dataset_review_history', context=dict(context), id=datasets[1]['id'])
+        result = helpers.call_action('dataset_review_history', context=dict(context), id=datasets[0]['id'])
+        assert len(result['results']) == 2
+
+        result = helpers.call_action(
+            'dataset_review_history', context=dict(context), user_id=submitter['id']
+        )
+        assert [e['package_id'] for e in result['results']] == [datasets[0]['id']]
+
+        from ckanext.onboarding_theodoro_bertol.model import ReviewAssignment
+        model.Session.query(ReviewAssignment).filter(
+            ReviewAssignment.package_id == datasets[1]['id']
+        ).update({'reviewer_id': reviewer['id']})
+        model.repo.commit()
+        mine = helpers.call_action('dataset_review_assignments', context=dict(context))
+        assert mine['results'] == []
+        theirs = helpers.call_action(
+            'dataset_review_assignments', context={'user': sysadmin['name']}, user_id=reviewer['id']
+        )
+        assert [d['id'] for d in theirs['results']] == [datasets[1]['id']]
+
+    def test_review_stats_follow_transitions(self):
+        """Test that the review counters are kept up to date incrementally"""
+        from ckanext.onboarding_theodoro_bertol.lib.stats import rebuild_stats
+        sysadmin = factories.Sysadmin()
+        user = factories.User()
+        org = factories.Organization(users=[{'name': user['name'], 'capacity': 'admin'}])
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        datasets = [
+            helpers.call_action(
+                'package_create',
+                context={'user': user['name'], 'ignore_auth': True},
+                name='test-dataset-stats-{}'.format(i),
+                owner_org=org['id'],
+                private=False
+            )
+            for i in range(3)
+        ]
+        result = helpers.call_action('review_stats', context=dict(context))
+        assert result['organizations'][org['name']] == {'pending': 3}
+
+        helpers.call_action(
+            'dataset_review_bulk', context=dict(context),
+            ids=[d['id'] for d in datasets[:2]], review_status='approved'
+        )
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=datasets[2]['id'], review_status='rejected'
+        )
+        helpers.call_action('package_delete', context=dict(context), id=datasets[0]['id'])
+
+        result = helpers.call_action('review_stats', context=dict(context), owner_org=org['name'])
+        assert result['totals'] == {'approved': 1, 'rejected': 1}
+        assert result['time_to_review']['count'] == 3
+        assert result['time_to_review']['p50'] == 3600
+
+        rebuild_stats()
+        rebuilt = helpers.call_action('review_stats', context=dict(context), owner_org=org['name'])
+        assert rebuilt['organizations'] == {org['name']: {'approved': 1, 'rejected': 1}}
+        assert rebuilt['time_to_review']['count'] == 3
+
+    def test_review_stats_date_range(self):
+        """Test counting the reviews made between two dates"""
+        sysadmin = factories.Sysadmin()
+        org = factories.Organization()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        datasets = [
+            helpers.call_action(
+                'package_create', context=dict(context),
+                name='test-dataset-stats-range-{}'.format(i),
+                owner_org=org['id'], private=False
+            )
+            for i in range(3)
+        ]
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=datasets[0]['id'], review_status='approved'
+        )
+
+        start = datetime.datetime.utcnow()
+        helpers.call_action(
+            'dataset_review_bulk', context=dict(context),
+            ids=[d['id'] for d in datasets[1:]], review_status='rejected'
+        )
+        end = datetime.datetime.utcnow()
+        # A second review, not following a submission
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=datasets[1]['id'], review_status='approved'
+        )
+
+        result = helpers.call_action(
+            'review_stats', context=dict(context),
+            reviewed_after=start.isoformat(), reviewed_before=end.isoformat()
+        )
+        assert result['reviewed']['totals'] == {'rejected': 2}
+        assert result['reviewed']['organizations'] == {org['name']: {'rejected': 2}}
+        assert result['reviewed']['time_to_review']['count'] == 2
+        assert result['totals'] == {'approved': 2, 'rejected': 1}
+
+        result = helpers.call_action(
+            'review_stats', context=dict(context), reviewed_after=start.isoformat()
+        )
+        assert result['reviewed']['totals'] == {'rejected': 2, 'approved': 1}
+        assert result['reviewed']['time_to_review']['count'] == 2
+
+        assert 'reviewed' not in helpers.call_action('review_stats', context=dict(context))
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action(
+                'review_stats', context=dict(context), reviewed_before='not a date'
+            )
+
+    def test_backfill_resumes_from_checkpoint(self, tmp_path):
+        """Test the review status backfill of datasets created before the plugin"""
+        from ckanext.onboarding_theodoro_bertol.lib import backfill
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        datasets = [
+            helpers.call_action(
+                'package_create', context=dict(context),
+                name='test-dataset-backfill-{}'.format(i), private=True
+            )
+            for i in range(5)
+        ]
+        public = sorted(d['id'] for d in datasets[:4])
+        model.Session.execute(
+            model.package_table.update()
+            .where(model.package_table.c.id.in_(public))
+            .values(private=False)
+        )
+        model.repo.commit()
+
+        checkpoint = str(tmp_path / 'backfill.checkpoint')
+        run = backfill.backfill(batch_size=2, checkpoint_path=checkpoint)
+        first = next(run)
+        run.close()
+        assert backfill.read_checkpoint(checkpoint)['last_id'] == first['last_id']
+
+        progress = list(backfill.backfill(batch_size=2, checkpoint_path=checkpoint))
+        assert progress[-1]['scanned'] == 5
+        assert progress[-1]['updated'] == 4
+        assert not os.path.exists(checkpoint)
+
+        for dataset in datasets:
+            result = helpers.call_action('package_show', context=dict(context), id=dataset['id'])
+            expected = 'approved' if dataset['id'] in public else None
+            assert result.get('review_status') == expected
+            # The fragment cache of the review block is keyed on it
+            changed = result['metadata_modified'] != dataset['metadata_modified']
+            assert changed == (dataset['id'] in public)
+        indexed = helpers.call_action(
+            'package_search', context=dict(context), fq='review_status:approved'
+        )
+        assert indexed['count'] == 4
+        stats = helpers.call_action('review_stats', context=dict(context))
+        assert stats['totals'] == {'approved': 4}
+
+        assert list(backfill.backfill(private_status='pending'))[-1]['updated'] == 1
+
+    def test_reindex_only_changed_datasets(self, tmp_path):
+        """Test that the selective reindex finds datasets through the review history"""
+        from ckanext.onboarding_theodoro_bertol.lib import reindex
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        datasets = [
+            helpers.call_action(
+                'package_create', context=dict(context),
+                name='test-dataset-reindex-{}'.format(i), private=False
+            )
+            for i in range(3)
+        ]
+
+        since = datetime.datetime.utcnow()
+        helpers.call_action(
+            'dataset_review_bulk', context=dict(context),
+            ids=[d['id'] for d in datasets[:2]], review_status='approved'
+        )
+        batches = list(reindex.changed_package_ids(since, batch_size=1))
+        assert batches == [[i] for i in sorted(d['id'] for d in datasets[:2])]
+
+        # search.rebuild commits after every batch, the ids must keep
+        # streaming while batches are indexed
+        assert list(reindex.index_batches(
+            reindex.changed_package_ids(since, batch_size=1)
+        )) == [1, 2]
+
+        checkpoint = str(tmp_path / 'reindex.checkpoint')
+        assert reindex.read_since(checkpoint) is None
+        reindex.write_since(checkpoint, since)
+        assert reindex.read_since(checkpoint) == since
+
+    def test_full_reindex_skips_deleted_datasets(self):
+        """Test that deleted datasets are not sent back to Solr by a full reindex"""
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import reviewed_package_ids
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        datasets = [
+            helpers.call_action(
+                'package_create', context=dict(context),
+                name='test-dataset-full-reindex-{}'.format(i), private=False
+            )
+            for i in range(3)
+        ]
+        helpers.call_action('package_delete', context=dict(context), id=datasets[0]['id'])
+
+        ids = [i for batch in reviewed_package_ids(batch_size=1) for i in batch]
+        assert ids == sorted(d['id'] for d in datasets[1:])
+
+    def test_pending_datasets_are_assigned_least_loaded(self):
+        """Test automatic assignment and rebalancing after a revocation"""
+        from ckanext.onboarding_theodoro_bertol.lib.assignment import rebalance
+        sysadmin = factories.Sysadmin()
+        reviewer = factories.User()
+        submitter = factories.User()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        helpers.call_action('user_reviewer_grant', context=dict(context), username=reviewer['name'])
+
+        for i in range(4):
+            helpers.call_action(
+                'package_create',
+                context={'user': submitter['name'], 'ignore_auth': True},
+                name='test-dataset-assigned-{}'.format(i),
+                private=False
+            )
+
+        mine = helpers.call_action(
+            'dataset_review_assignments', context={'user': reviewer['name'], 'ignore_auth': True}
+        )
+        theirs = helpers.call_action(
+            'dataset_review_assignments', context=dict(context)
+        )
+        assert len(mine['results']) == len(theirs['results']) == 2
+
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=mine['results'][0]['id'], review_status='approved'
+        )
+        mine = helpers.call_action(
+            'dataset_review_assignments', context={'user': reviewer['name'], 'ignore_auth': True}
+        )
+        assert len(mine['results']) == 1
+
+        helpers.call_action('user_reviewer_revoke', context=dict(context), username=reviewer['name'])
+        assert rebalance() == 1
+        theirs = helpers.call_action(
+            'dataset_review_assignments', context=dict(context), user_id=sysadmin['id']
+        )
+        assert len(theirs['results']) == 3
+
+    def test_review_with_a_bare_user_name_in_the_context(self):
+        """Test that the reviewer is recorded by id and matches their own claim"""
+        sysadmin = factories.Sysadmin()
+        datasets = [factories.Dataset(private=False) for i in range(2)]
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        helpers.call_action('dataset_review_claim', context=dict(context), id=datasets[0]['id'])
+        reviewed = helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=datasets[0]['id'], review_status='approved'
+        )
+        assert reviewed['reviewer_id'] == sysadmin['id']
+
+        helpers.call_action('dataset_review_claim', context=dict(context), id=datasets[1]['id'])
+        result = helpers.call_action(
+            'dataset_review_bulk', context=dict(context),
+            ids=[datasets[1]['id']], review_status='rejected'
+        )
+        assert result['conflicts'] == []
+        history = helpers.call_action(
+            'dataset_review_history', context=dict(context), id=datasets[1]['id']
+        )
+        assert history['results'][0]['user_id'] == sysadmin['id']
+
+    def test_claimed_dataset_cannot_be_reviewed_by_others(self):
+        """Test that a live claim makes other reviewers fail fast"""
+        sysadmin = factories.Sysadmin()
+        reviewer = factories.User()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        helpers.call_action('user_reviewer_grant', context=dict(context), username=reviewer['name'])
+        datasets = [factories.Dataset(private=False) for i in range(2)]
+
+        claim = helpers.call_action(
+            'dataset_review_claim',
+            context={'user': reviewer['name'], 'ignore_auth': True},
+            id=datasets[0]['id']
+        )
+        assert claim['user_id'] == reviewer['id']
+
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action(
+                'dataset_review', context=dict(context),
+                id=datasets[0]['id'], review_status='approved'
+            )
+
+        result = helpers.call_action(
+            'dataset_review_bulk', context=dict(context),
+            ids=[d['id'] for d in datasets], review_status='approved'
+        )
+        assert result['datasets'] == [datasets[1]['id']]
+        assert result['conflicts'] == [datasets[0]['id']]
+
+        reviewed = helpers.call_action(
+            'dataset_review',
+            context={'user': reviewer['name'], 'ignore_auth': True},
+            id=datasets[0]['id'], review_status='rejected'
+        )
+        assert reviewed['review_status'] == 'rejected'
+
+    def test_stale_review_is_rejected(self):
+        """Test the compare-and-set on metadata_modified"""
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        dataset = factories.Dataset(private=False)
+        seen = helpers.call_action('package_show', context=dict(context), id=dataset['id'])
+
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=dataset['id'], review_status='rejected',
+            expected_modified=seen['metadata_modified']
+        )
+        with pytest.raises(logic.ValidationError):
+            helpers.call_action(
+                'dataset_review', context=dict(context),
+                id=dataset['id'], review_status='approved',
+                expected_modified=seen['metadata_modified']
+            )
+
+    def test_package_create_many(self):
+        """Test bulk ingest mode: defaults, partial failures and batched indexing"""
+        from ckan.lib.search.index import PackageSearchIndex
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+
+        # The failing dataset is in the middle of the first batch
+        with patch.object(PackageSearchIndex, 'commit', autospec=True,
+                          side_effect=PackageSearchIndex.commit) as commit:
+            result = helpers.call_action(
+                'package_create_many', context=dict(context), batch_size=2,
+                datasets=[
+                    {'name': 'test-bulk-0', 'private': False},
+                    {'name': 'Not a valid name!'},
+                    {'name': 'test-bulk-1', 'private': False},
+                    {'name': 'test-bulk-3'},
+                ]
+            )
+        assert len(result['ids']) == 3
+        assert [e['index'] for e in result['errors']] == [1]
+        # One Solr commit per batch
+        assert commit.call_count == 2
+
+        for name, status in (('test-bulk-0', 'pending'), ('test-bulk-3', None)):
+            dataset = helpers.call_action('package_show', context=dict(context), id=name)
+            assert dataset['private'] is True
+            assert dataset.get('review_status') == status
+
+        indexed = helpers.call_action(
+            'package_search', context=dict(context), q='name:test-bulk-*', include_private=True
+        )
+        assert indexed['count'] == 3
+        stats = helpers.call_action('review_stats', context=dict(context))
+        assert stats['totals'] == {'pending': 2}
+
+    def test_review_fields_are_indexed(self):
+        """Test filtering and sorting on the dedicated review index fields"""
+        sysadmin = factories.Sysadmin()
+        dataset = factories.Dataset(private=False)
+
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='rejected'
+        )
+
+        result = helpers.call_action(
+            'package_search',
+            fq='review_status:rejected AND reviewer_id:"{}" AND review_date:[NOW-1DAY TO NOW+1DAY]'.format(sysadmin['id']),
+            sort='review_date desc',
+            include_private=True
+        )
+        assert [d['id'] for d in result['results']] == [dataset['id']]
+
+
+class TestIndexReviewFields:
+    """Test the before_dataset_index hook"""
+
+    def test_promotes_extras_and_converts_date(self):
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import index_review_fields
+        pkg_dict = index_review_fields({
+            'extras_review_status': 'approved',
+            'extras_reviewer_id': 'some-user-id',
+            'extras_review_date': '2026-10-18T09:30:12.345678',
+        })
+
+        assert pkg_dict['review_status'] == 'approved'
+        assert pkg_dict['reviewer_id'] == 'some-user-id'
+        assert pkg_dict['review_date'] == '2026-10-18T09:30:12Z'
+
+    def test_legacy_display_date_and_garbage(self):
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import index_review_fields
+        pkg_dict = index_review_fields({'review_date': 'October 18, 2026, 09:30 (UTC)'})
+        assert pkg_dict['review_date'] == '2026-10-18T09:30:00Z'
+
+        pkg_dict = index_review_fields({'review_date': 'not a date', 'review_status': ''})
+        assert 'review_date' not in pkg_dict
+        assert 'review_status' not in pkg_dict
+
+    def test_legacy_display_date_in_another_timezone(self):
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import index_review_fields
+        pkg_dict = index_review_fields({'review_date': 'October 18, 2026, 09:30 (America/Sao_Paulo)'})
+        assert pkg_dict['review_date'] == '2026-10-18T12:30:00Z'
+
+        pkg_dict = index_review_fields({'review_date': 'October 18, 2026, 09:30 (Nowhere/Land)'})
+        assert 'review_date' not in pkg_dict
+
+    def test_submission_date_of_pending_datasets(self):
+        from ckanext.onboarding_theodoro_bertol.lib.review_state import index_review_fields
+        pkg_dict = index_review_fields({
+            'extras_review_status': 'pending',
+            'extras_review_submitted': '2026-10-18T09:30:12.345678',
+        })
+        assert pkg_dict['review_submitted_date'] == '2026-10-18T09:30:12Z'
+
+        pkg_dict = index_review_fields({
+            'extras_review_status': 'approved',
+            'extras_review_submitted': '2026-10-18T09:30:12.345678',
+        })
+        assert 'review_submitted_date' not in pkg_dict
@@ -0,0 +1,240 @@
+"""Tests for the review views"""
+import csv
+import io
+import json
+import pytest
+import ckan.tests.factories as factories
+import ckan.tests.helpers as helpers
+from ckan.plugins import toolkit as tk
+
+
+class TestConditionalGet:
+    """Test the ETag validation of the review pages"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    def test_reviewers_page_not_modified_until_roster_changes(self, app):
+        """Test that the roster page answers 304 until a reviewer is granted"""
+        sysadmin = factories.SysadminWithToken()
+        user = factories.User()
+        url = tk.url_for('onboarding_admin.reviewers')
+        headers = {'Authorization': sysadmin['token']}
+
+        response = app.get(url, headers=headers)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 304
+
+        helpers.call_action(
+            'user_reviewer_grant',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=user['name']
+        )
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+        assert user['name'] in response.body
+
+    def test_reviews_list_not_modified_until_a_review(self, app):
+        """Test that a status-filtered queue answers 304 until a review state changes"""
+        sysadmin = factories.SysadminWithToken()
+        dataset = factories.Dataset(private=False)
+        url = tk.url_for('onboarding_reviews.dataset_reviews_list', review_status='pending')
+        headers = {'Authorization': sysadmin['token']}
+
+        etag = app.get(url, headers=headers).headers['ETag']
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 304
+
+        other = app.get(
+            tk.url_for('onboarding_reviews.dataset_reviews_list', review_status='approved'),
+            headers=dict(headers, **{'If-None-Match': etag})
+        )
+        assert other.status_code == 200
+
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='approved'
+        )
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+
+    def test_unfiltered_reviews_list_not_modified_until_a_dataset_changes(self, app):
+        """Test that the list of every visible dataset answers 304 until a dataset changes"""
+        sysadmin = factories.SysadminWithToken()
+        url = tk.url_for('onboarding_reviews.dataset_reviews_list')
+        headers = {'Authorization': sysadmin['token']}
+
+        etag = app.get(url, headers=headers).headers['ETag']
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 304
+
+        org = factories.Organization()
+        dataset = factories.Dataset(owner_org=org['id'], title='A dataset outside of review')
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+        assert 'A dataset outside of review' in response.body
+
+        etag = response.headers['ETag']
+        helpers.call_action(
+            'bulk_update_delete', context={'user': sysadmin['name'], 'ignore_auth': True},
+            datasets=[dataset['id']], org_id=org['id']
+        )
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+
+    def test_reviews_list_etag_follows_memberships(self, app):
+        """Test that joining an organization changes the ETag of the queue"""
+        sysadmin = factories.Sysadmin()
+        reviewer = factories.UserWithToken()
+        helpers.call_action(
+            'user_reviewer_grant', context={'user': sysadmin['name'], 'ignore_auth': True},
+            username=reviewer['name']
+        )
+        url = tk.url_for('onboarding_reviews.dataset_reviews_list', review_status='pending')
+        headers = {'Authorization': reviewer['token']}
+
+        etag = app.get(url, headers=headers).headers['ETag']
+        factories.Organization(users=[{'name': reviewer['name'], 'capacity': 'editor'}])
+        response = app.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+
+
+class TestExport:
+    """Test the streaming review exports"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        helpers.reset_db()
+
+    def test_export_states_csv(self, app):
+        """Test exporting the review state of every dataset as CSV"""
+        sysadmin = factories.SysadminWithToken()
+        reviewed = factories.Dataset(private=False)
+        draft = factories.Dataset()
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=reviewed['id'],
+            review_status='approved'
+        )
+
+        response = app.get(
+            tk.url_for('onboarding_reviews.export_reviews'),
+            headers={'Authorization': sysadmin['token']}
+        )
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/csv')
+
+        rows = list(csv.DictReader(io.StringIO(response.body)))
+        by_id = dict((row['id'], row) for row in rows)
+        assert by_id[reviewed['id']]['review_status'] == 'approved'
+        assert by_id[reviewed['id']]['reviewer_id'] == sysadmin['id']
+        assert by_id[draft['id']]['review_status'] == ''
+
+    def test_export_history_ndjson(self, app):
+        """Test exporting the review history of a dataset as NDJSON"""
+        sysadmin = factories.SysadminWithToken()
+        dataset = factories.Dataset(private=False)
+        helpers.call_action(
+            'dataset_review',
+            context={'user': sysadmin['name'], 'ignore_auth': True},
+            id=dataset['id'],
+            review_status='rejected'
+        )
+
+        response = app.get(
+            tk.url_for('onboarding_reviews.export_reviews', kind='history',
+                       format='ndjson', package_id=dataset['id']),
+            headers={'Authorization': sysadmin['token']}
+        )
+        events = [json.loads(line) for line in response.body.splitlines()]
+        assert [e['review_status'] for e in events] == ['pending', 'rejected']
+
+    def test_export_requires_sysadmin(self, app):
+        """Test that regular users cannot export"""
+        user = factories.UserWithToken()
+
+        response = app.get(
+            tk.url_for('onboarding_reviews.export_reviews'),
+            headers={'Authorization': user['token']}
+        )
+        assert response.status_code == 403
+
+
+class TestMetrics:
+    """Test the /metrics endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test fixtures"""
+        from ckanext.onboarding_theodoro_bertol.lib import metrics
+        helpers.reset_db()
+        metrics.reset()
+        yield
+        metrics.configure({})
+        metrics.reset()
+
+    def test_metrics_disabled_by_default(self, app):
+        """Test that nothing is exposed or collected unless enabled"""
+        from ckanext.onboarding_theodoro_bertol.lib import metrics
+        metrics.configure({})
+        sysadmin = factories.Sysadmin()
+        helpers.call_action(
+            'package_create', context={'user': sysadmin['name'], 'ignore_auth': True},
+            name='test-dataset-metrics-off', private=False
+        )
+
+        assert 'package_create' not in metrics.render()
+        assert app.get(tk.url_for('onboarding_metrics.render_metrics')).status_code == 404
+
+    def test_metrics_count_instrumented_operations(self, app):
+        """Test the latency, SQL and Solr counters of the review actions"""
+        from ckanext.onboarding_theodoro_bertol.lib import metrics
+        metrics.configure({'ckanext.onboarding_theodoro_bertol.metrics.enabled': 'true'})
+        sysadmin = factories.Sysadmin()
+        context = {'user': sysadmin['name'], 'ignore_auth': True}
+        dataset = helpers.call_action(
+            'package_create', context=dict(context),
+            name='test-dataset-metrics', private=False
+        )
+        helpers.call_action(
+            'dataset_review', context=dict(context),
+            id=dataset['id'], review_status='approved'
+        )
+        with pytest.raises(Exception):
+            helpers.call_action(
+                'dataset_review', context=dict(context),
+                id=dataset['id'], review_status='not-a-status'
+            )
+
+        response = app.get(tk.url_for('onboarding_metrics.render_metrics'))
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        lines = dict(
+            line.rsplit(' ', 1) for line in response.body.splitlines()
+            if not line.startswith('#')
+        )
+        assert lines['onboarding_operation_calls_total{operation="dataset_review",outcome="ok"}'] == '1'
+        assert lines['onboarding_operation_calls_total{operation="dataset_review",outcome="error"}'] == '1'
+        assert lines['onboarding_operation_duration_seconds_count{operation="package_create"}'] == '1'
+        assert lines['onboarding_operation_duration_seconds_bucket{le="+Inf",operation="dataset_review"}'] == '2'
+        assert int(lines['onboarding_operation_sql_queries_total{operation="package_create"}']) > 0
+        assert int(lines['onboarding_operation_solr_requests_total{operation="dataset_review"}']) > 0
+
+    @pytest.mark.ckan_config('ckanext.onboarding_theodoro_bertol.metrics.token', 'secret')
+    def test_metrics_token(self, app):
+        """Test that a configured token is required"""
+        from ckanext.onboarding_theodoro_bertol.lib import metrics
+        metrics.configure({'ckanext.onboarding_theodoro_bertol.metrics.enabled': 'true'})
+        url = tk.url_for('onboarding_metrics.render_metrics')
+
+        assert app.get(url).status_code == 403
+        assert app.get(url, headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -1,7 +1,10 @@
 from flask import Blueprint
 import ckan.lib.base as base
+import ckan.lib.helpers as h
 import ckan.model as model
-from sqlalchemy import Boolean, or_
+from ckan.common import g
+from ckanext.onboarding_theodoro_bertol.lib import versions
+from ckanext.onboarding_theodoro_bertol.model import Reviewer
 import logging
 
 log = logging.getLogger(__name__)
@@ -9,20 +12,18 @@ log = logging.getLogger(__name__)
 admin = Blueprint('onboarding_admin', __name__, url_prefix='/ckan-admin')
 
 def _get_reviewers():
-    """Get all users with reviewer permissions"""
-    q = model.Session.query(model.User).filter(
-        or_(
-            model.User.plugin_extras.op("->>")("review_permission").cast(Boolean) == True,
-            model.User.sysadmin == True  # Include sysadmins
-        ),
-        model.User.state == 'active'
-    )
-    return q
+    """Get all users with reviewer permissions (sysadmins included)"""
+    return Reviewer.roster().order_by(model.User.name)
 
 def reviewers():
     log.info("Admin reviewers page accessed")
-    data = dict(reviewers=[u.name for u in _get_reviewers()])
-    return base.render('admin/reviewers.html', extra_vars=data)
+
+    def render():
+        data = dict(reviewers=[u.name for u in _get_reviewers()])
+        return base.render('admin/reviewers.html', extra_vars=data)
+
+    # Answer repeated requests with 304 until the roster changes
+    return versions.conditional_get([versions.ROSTER], render, g.user, h.lang())
 
 admin.add_url_rule(
     '/reviewers', view_func=reviewers, methods=['GET'], strict_slashes=False
@@ -29,7 +29,8 @@ def review():
         # Call the dataset_review action
         result = logic.get_action("dataset_review")(context, {
             "id": dataset_id,
-            "review_status": review_status
+            "review_status": review_status,
+            "expected_modified": request.form.get("metadata_modified")
         })
         
         if review_status == "approved":
@@ -44,6 +45,12 @@ def review():
     except logic.NotAuthorized as e:
         log.warning(f"Not authorized to review dataset - user: {g.user}, dataset_id: {dataset_id}")
         flash_error(_("You are not authorized to review datasets"))
+    except logic.ValidationError as e:
+        # Claimed by another reviewer or modified since the page was loaded
+        log.info(f"Review conflict - dataset_id: {dataset_id}, {e.error_summary}")
+        flash_error(_("The dataset could not be reviewed: %s") % "; ".join(
+            msg for msgs in e.error_dict.values() for msg in msgs
+        ))
     except logic.NotFound as e:
         log.error(f"Dataset not found - dataset_id: {dataset_id}")
         flash_error(_("Dataset not found"))
@@ -0,0 +1,27 @@
+import hmac
+
+from flask import Blueprint, Response
+from ckan.common import request
+from ckan.lib.base import abort
+from ckan.plugins import toolkit as tk
+from ckanext.onboarding_theodoro_bertol.lib import metrics as metrics_lib
+
+metrics = Blueprint('onboarding_metrics', __name__)
+
+def render_metrics():
+    """Expose the extension metrics in the Prometheus text format
+
+    Only served when metrics are enabled. If
+    ``ckanext.onboarding_theodoro_bertol.metrics.token`` is set, scrapers
+    must send it as a bearer token.
+    """
+    if not metrics_lib.enabled():
+        abort(404)
+    token = tk.config.get(metrics_lib.CONFIG_PREFIX + 'token')
+    if token:
+        given = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(given.encode('utf-8'), 'Bearer {}'.format(token).encode('utf-8')):
+            abort(403)
+    return Response(metrics_lib.render(), mimetype=None, content_type=metrics_lib.CONTENT_TYPE)
+
+metrics.add_url_rule('/metrics', view_func=render_metrics, methods=['GET'])
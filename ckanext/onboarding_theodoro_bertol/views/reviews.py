@@ -1,15 +1,19 @@
-from flask import Blueprint
+from flask import Blueprint, Response, stream_with_context
 from ckan.common import g, _, request
 import ckan.logic as logic
 import ckan.lib.helpers as h
 import ckan.model as model
-from ckan.lib.base import render
+from ckan.lib.base import abort, render
+from ckanext.onboarding_theodoro_bertol.lib import export, metrics, versions
 import logging
 
 log = logging.getLogger(__name__)
 
 reviews = Blueprint("onboarding_reviews", __name__, url_prefix="/dataset-reviews")
 
+REVIEW_STATUSES = ('pending', 'approved', 'rejected')
+
+@metrics.timed('dataset_reviews_view')
 def dataset_reviews_list():
     """List all datasets pending review or recently reviewed"""
     context = {
@@ -25,53 +29,70 @@ def dataset_reviews_list():
     if not is_reviewer:
         h.flash_error(_('You must be a reviewer to access this page'))
         return h.redirect_to('home.index')
-    
+
+    def render():
+        return _render_reviews_list(context, is_reviewer)
+
+    # The queue only changes with review transitions, the reviewers'
+    # names, the organizations the user can see and, for the unfiltered
+    # list of every visible dataset, any dataset change, so repeated
+    # requests get a 304 until then
+    names = [versions.REVIEW, versions.ROSTER]
+    if request.args.get('review_status') not in REVIEW_STATUSES:
+        names.append(versions.DATASETS)
+    return versions.conditional_get(
+        names, render,
+        g.user, _memberships(g.userobj), request.query_string.decode('utf-8'), h.lang()
+    )
+
+def _memberships(user):
+    """The organizations and capacities of a user, part of the ETag as
+    they decide which private datasets the queue shows"""
+    rows = model.Session.query(model.Member.group_id, model.Member.capacity).filter(
+        model.Member.table_name == 'user',
+        model.Member.table_id == user.id,
+        model.Member.state == 'active',
+    ).order_by(model.Member.group_id)
+    return ','.join('{}:{}'.format(group_id, capacity) for group_id, capacity in rows)
+
+def _render_reviews_list(context, is_reviewer):
+    from ckanext.onboarding_theodoro_bertol.lib.helpers import get_user_display_names
     try:
         # Get filter parameters
         review_status = request.args.get('review_status', '')
+        cursor = request.args.get('cursor', '')
         
-        # Build search query
-        search_params = {
-            'q': '*:*',
-            'rows': 100,
-            'sort': 'metadata_modified desc',
-            'facet.field': ['review_status']
-        }
-        
-        # Add review status filter if specified
+        # Get one page of the review queue
+        queue_params = {'limit': request.args.get('limit')}
         if review_status:
-            search_params['fq'] = f'review_status:{review_status}'
+            queue_params['review_status'] = review_status
+        if cursor:
+            queue_params['cursor'] = cursor
+        
+        dataset_review_queue = logic.get_action('dataset_review_queue')
+        search_results = dataset_review_queue(context, queue_params)
         
-        # Search for datasets
-        package_search = logic.get_action('package_search')
-        search_results = package_search(context, search_params)
+        # Resolve all reviewer names of the page with a single query
+        results = search_results.get('results', [])
+        reviewer_names = get_user_display_names(d.get('reviewer_id') for d in results)
         
-        # Filter datasets based on user access
-        filtered_datasets = []
-        for dataset in search_results.get('results', []):
-            # Check if user has access to this dataset
-            try:
-                logic.check_access('package_show', context, {'id': dataset['id']})
-                # Add reviewer info if available
-                if dataset.get('reviewer_id'):
-                    try:
-                        user_show = logic.get_action('user_show')
-                        reviewer = user_show(context, {'id': dataset['reviewer_id']})
-                        dataset['reviewer_name'] = reviewer.get('display_name', reviewer.get('name'))
-                    except:
-                        dataset['reviewer_name'] = 'Unknown'
-                filtered_datasets.append(dataset)
-            except logic.NotAuthorized:
-                continue
+        # The queue only returns datasets the user can see (permission
+        # labels are applied by the search), so no per-row access check
+        for dataset in results:
+            # Add reviewer info if available
+            if dataset.get('reviewer_id'):
+                dataset['reviewer_name'] = reviewer_names.get(dataset['reviewer_id'], _('Unknown'))
         
         # Get review status facets
-        facets = search_results.get('facets', {}).get('review_status', {})
+        facets = search_results.get('facets', {})
         
         extra_vars = {
-            'datasets': filtered_datasets,
-            'total_count': len(filtered_datasets),
+            'datasets': results,
+            'total_count': search_results['count'],
             'facets': facets,
             'current_filter': review_status,
+            'cursor': cursor,
+            'next_cursor': search_results.get('next_cursor'),
             'is_reviewer': is_reviewer
         }
         
@@ -82,5 +103,86 @@ def dataset_reviews_list():
         h.flash_error(_('Error loading dataset reviews'))
         return h.redirect_to('home.index')
 
+def bulk_review():
+    """Approve or reject the datasets selected on the reviews list"""
+    dataset_ids = request.form.getlist('ids')
+    review_status = request.form.get('review_status')
+
+    if not dataset_ids or not review_status:
+        h.flash_error(_('Select at least one dataset to review'))
+        return h.redirect_to('onboarding_reviews.dataset_reviews_list')
+
+    context = {
+        'user': g.user,
+        'auth_user_obj': g.userobj,
+        'ignore_auth': False
+    }
+
+    try:
+        result = logic.get_action('dataset_review_bulk')(context, {
+            'ids': dataset_ids,
+            'review_status': review_status
+        })
+
+        count = len(result['datasets'])
+        if review_status == 'approved':
+            h.flash_success(_('{count} datasets have been approved').format(count=count))
+        else:
+            h.flash_success(_('{count} datasets have been rejected').format(count=count))
+
+        if result['not_found']:
+            h.flash_error(_('Datasets not found: {ids}').format(ids=', '.join(result['not_found'])))
+        if result['conflicts']:
+            h.flash_error(_('Datasets being reviewed by another reviewer: {ids}').format(
+                ids=', '.join(result['conflicts'])))
+
+    except logic.NotAuthorized:
+        log.warning("Not authorized to bulk review datasets - user: %s", g.user)
+        h.flash_error(_('You are not authorized to review datasets'))
+    except logic.ValidationError as e:
+        h.flash_error(_('Invalid review request: %s') % e.error_summary)
+    except Exception as e:
+        log.error("Error bulk reviewing datasets: %s", e)
+        h.flash_error(_('An error occurred while reviewing the datasets: %s') % str(e))
+
+    return h.redirect_to('onboarding_reviews.dataset_reviews_list')
+
+def export_reviews():
+    """Stream the review state of every dataset, or the review history
+
+    ``kind`` is ``states`` (default) or ``history`` and ``format`` is
+    ``csv`` (default) or ``ndjson``. Rows are written as they are read from
+    the database, so the download starts immediately.
+    """
+    context = {
+        'user': g.user,
+        'auth_user_obj': g.userobj,
+    }
+    try:
+        logic.check_access('review_export', context, {})
+    except logic.NotAuthorized:
+        abort(403, _('Not authorized to export the review data'))
+
+    kind = request.args.get('kind', 'states')
+    fmt = request.args.get('format', 'csv')
+    if kind not in ('states', 'history') or fmt not in export.FORMATS:
+        abort(400, _('Unknown export kind or format'))
+
+    filters = {}
+    if kind == 'history':
+        filters = dict(
+            package_id=request.args.get('package_id'),
+            user_id=request.args.get('user_id'),
+        )
+
+    filename = 'review-{}.{}'.format(kind, fmt)
+    return Response(
+        stream_with_context(export.export(kind, fmt, **filters)),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)},
+    )
+
 # Register routes
-reviews.add_url_rule('/', view_func=dataset_reviews_list, methods=['GET'])
\ No newline at end of file
+reviews.add_url_rule('/', view_func=dataset_reviews_list, methods=['GET'])
+reviews.add_url_rule('/bulk', view_func=bulk_review, methods=['POST'])
+reviews.add_url_rule('/export', view_func=export_reviews, methods=['GET'])